@@ -1,10 +1,27 @@
-import json
+from __future__ import annotations
 import time
+from typing import TYPE_CHECKING
 import requests
-from aws_requests_auth.aws_auth import AWSRequestsAuth
-import helper
+import credentials
+import journal
 import data
-from gui import MainTab
+import fanout
+import payload
+import profiling
+import ratelimit
+import regions
+import responses
+import schedules
+import shards
+import soak
+import transport
+
+if TYPE_CHECKING:
+    from gui import MainTab
+
+# HTTP transports owned by the send engine, one connection pool per region.
+# Created on first Start and reused by all following runs, closed on app exit.
+_transports = {}
 
 
 def get_arn_by_name(window: MainTab, settings: data.AppSettings) -> str:
@@ -13,123 +30,250 @@ def get_arn_by_name(window: MainTab, settings: data.AppSettings) -> str:
     return selected_arn
 
 
+def get_target_channels(window: MainTab, settings: data.AppSettings) -> dict:
+    """Returns {name: arn} of channels to send to: all saved channels
+    in fan-out mode, otherwise the one selected in main tab"""
+    if window.all_channels.get():
+        return dict(settings.arns)
+    selected_arn_name = window.selected_arn.get()
+    return {selected_arn_name: get_arn_by_name(window, settings)}
+
+
 def send_metadata(window: MainTab, settings: data.AppSettings) -> None:
     window.write_to_log("Started")
 
-    # Value to check the stop_flag every 0.1 seconds
-    check_interval = 0.1
+    # Get channels to send to (selected one or all saved in fan-out mode)
+    channels = get_target_channels(window, settings)
 
-    # Get arn of channel selected in main tab
-    selected_arn = get_arn_by_name(window, settings)
+    try:
+        # Template/schedule/credential errors and oversized metadata are reported before anything is sent
+        try:
+            payload.validate_template(settings.metadata_message, channels, settings.pack_rate > 0)
+            schedules.validate_spec(settings.schedule, settings.wait)
+
+            # Credentials from the configured source (pasted, file or command)
+            credential_provider = credentials.from_settings(settings)
+            run_credentials = credential_provider.get()
+        except (payload.TemplateError, schedules.ScheduleError, credentials.CredentialsError) as e:
+            window.write_to_log(f"{data.WARNING_PREFIX}{e}")
+            return
+
+        expires_in = run_credentials.expires_in()
+        if expires_in is not None and expires_in <= 0:
+            window.write_to_log(f"{data.WARNING_PREFIX}Credentials expired at {run_credentials.expiration_str()}")
+            return
+        # Expiry of credentials in use, kept up to date by CredentialManager (shown by the metrics endpoint)
+        window.run_credentials = run_credentials
+
+        # Windowed counters and memory growth report of long runs
+        soak_monitor = soak.from_settings(window, settings)
+        if soak_monitor is not None:
+            soak_monitor.start()
+        try:
+            if shards.enabled(settings, channels):
+                # Channels split across worker processes, each runs run_engine for its shard
+                shards.run(window, settings, channels)
+            else:
+                run_engine(window, settings, channels, credential_provider, run_credentials)
+        finally:
+            if soak_monitor is not None:
+                soak_monitor.stop()
+    finally:
+        window.run_credentials = None
+        window.write_to_log("Stopped")
+        window.stop_action()
+
+
+def run_engine(window: MainTab, settings: data.AppSettings, channels: dict, credential_provider,
+               run_credentials: credentials.Credentials) -> None:
+    """Sends to channels with the configured engine in this process until stopped"""
+    # Regional endpoint and SigV4 signer of every channel, shared by both engines
+    router = regions.Router(*run_credentials[:3], channels, settings.endpoint_url)
+    if len(router.regions) > 1 or settings.endpoint_url:
+        window.write_to_log(router.summary())
+
+    # Optional on-disk record of every request
+    try:
+        send_journal = journal.from_settings(settings)
+    except OSError as e:
+        window.write_to_log(f"{data.WARNING_PREFIX}Send journal can't be opened: {e}")
+        return
+
+    # Swaps in new credentials ahead of expiry while sending
+    credential_manager = credentials.CredentialManager(credential_provider, router, run_credentials, window,
+                                                       settings.credential_refresh_before).start()
+    try:
+        # Optional per-phase timing breakdown and cProfile dump of the run
+        profile_path = settings.get_settings_path(settings.profile_path) if settings.profile_path else ""
+        with profiling.sampling(settings.profile_phases) as sampler, profiling.cprofile_capture(profile_path):
+            if settings.engine == "async":
+                send_metadata_async(window, settings, channels, router, send_journal)
+            else:
+                send_metadata_sync(window, settings, channels, router, send_journal)
+        if sampler is not None:
+            window.write_to_log(sampler.report())
+    finally:
+        credential_manager.stop()
+        if send_journal is not None:
+            send_journal.close()
+
+
+def send_metadata_sync(window: MainTab, settings: data.AppSettings, channels: dict, router: regions.Router,
+                       send_journal: journal.SendJournal or None) -> None:
+    # Prebuild request body of each channel, only placeholder values are spliced in per send
+    body_templates = get_body_templates(settings, channels)
+
+    # Get pooled keep-alive transport of each region (reused between Start/Stop cycles).
+    # Fan-out workers may all send to one region, each needs a connection of its own
+    pool_size = max(settings.pool_size, fanout.worker_count(settings, len(channels)))
+    transports = {region: get_transport(settings, region, pool_size) for region in router.regions}
+
+    def send(arn: str, metadata_index: int, metadata: str = None) -> data.SendResult:
+        body_template = body_templates[arn]
+        route = router.route(arn)
+        http = transports[route.region]
+        with profiling.phase("render"):
+            body, metadata = body_template.render(metadata_index, metadata)
+        with profiling.phase("sign"):
+            headers = sign_request(route, settings, body)
+        request_time = time.monotonic()
+        request_wall_time = time.time()
+        try:
+            with profiling.phase("http"):
+                response = http.post(route.url, data=body, headers=headers, timeout=settings.request_timeout)
+        except requests.RequestException as e:
+            result = data.SendResult(f"{type(e).__name__}: {e}", None, transport.get_error_class(e))
+        else:
+            with profiling.phase("parse"):
+                result = get_send_result(response, metadata)
+        # Latency is counted from the moment the request got its connection
+        acquired_time = http.acquired_time(request_time)
+        request_wall_time += acquired_time - request_time
+        request_time = acquired_time
+        record_send(window, send_journal, body_template, metadata_index, metadata, request_time, request_wall_time,
+                    result)
+        return result
+
+    if len(channels) > 1:
+        fanout.run(window, settings, channels, send)
+    else:
+        send_to_channel(window, settings, *next(iter(channels.items())), send)
 
-    # Get 'delay' from settings
-    send_interval = settings.wait
 
-    # Get 'index' from settings
-    metadata_index = settings.metadata_start_index
+def send_metadata_async(window: MainTab, settings: data.AppSettings, channels: dict, router: regions.Router,
+                        send_journal: journal.SendJournal or None) -> None:
+    # aiohttp is an optional dependency, needed only for async engine
+    try:
+        import async_engine
+    except ImportError as e:
+        window.write_to_log(f"{data.WARNING_PREFIX}Async engine is not available: {e}")
+        return
 
-    # Get metadata 'message' from settings
-    message = settings.metadata_message
+    async_engine.run(window, settings, channels, router, send_journal)
 
-    # Get 'credentials' from settings
-    credentials = settings.credentials
 
-    # Extract and define values for access_key, secret_access_key, session_token
-    cred_values = tuple(credentials.values())[:3]
-    access_key, secret_access_key, session_token = cred_values
+def send_to_channel(window: MainTab, settings: data.AppSettings, name: str, arn: str, send) -> None:
+    # Own index, schedule ('delay' from settings) and retry/rate state of the channel
+    state = fanout.new_channel_state(window, settings, name, arn)
 
-    # Define the API endpoint URL
-    endpoint_url = settings.endpoint_url
+    # Channel and account PutMetadata rate limits, as in fan-out (a shard worker gets its share of the account one)
+    bucket = ratelimit.from_settings(settings, (arn,))[arn]
 
-    # Define the headers
-    headers = settings.headers
+    # Make the API calls
+    while state.active and state.schedule.wait_next():
+        while True:
+            # Retries take tokens too; None = stopped while waiting for one
+            result = None
+            if not bucket.acquire(window.stop_event):
+                break
+            result = send(arn, state.index, state.schedule.metadata)
+            retry_delay = state.rate.handle(result, state.schedule, state.index)
 
-    if all((access_key, secret_access_key, session_token)):
-        # Create an instance of AWSRequestsAuth
-        auth = create_auth_instance(access_key, secret_access_key, session_token)
+            # Write response message (and lateness of the tick or retry info) into Main tab's logs window
+            with profiling.phase("log"):
+                log_line = state.log_line(result)
+                if log_line is not None:
+                    window.write_to_log(log_line)
 
-        try:
-            # Make the API calls
-            while not window.stop_flag:
-                # Define the custom request body
-                request_body = {
-                    "channelArn": selected_arn,
-                    "metadata": f"{message}_{metadata_index}"
-                }
+            if retry_delay is None or window.stop_event.wait(retry_delay):
+                break
+        if result is None:
+            break
 
-                # Get request time
-                request_time = helper.now_datetime(obj=True)
+        # Permanent server error (or too many retries) ends the run
+        state.record(result)
+        if result.failed:
+            window.metrics.record_failure()
 
-                response = requests.post(endpoint_url, json=request_body, headers=headers, auth=auth)
+    if state.rate.retries:
+        window.write_to_log(state.summary())
 
-                # Get response time and message from response
-                response_time = helper.now_datetime(obj=True)
-                message_from_response = get_message_from_response(response, window)
 
-                # Write response message into Main tab's logs window
-                window.write_to_log(message_from_response)
+def record_send(window: MainTab, send_journal: journal.SendJournal or None, body_template: payload.BodyTemplate,
+                metadata_index: int, metadata: str, request_time: float, request_wall_time: float,
+                result: data.SendResult) -> None:
+    """Adds a finished request to run metrics and the send journal"""
+    response_time = time.monotonic()
+    window.metrics.record_send(response_time - request_time, result.status, result.error_class)
+    if send_journal is not None:
+        send_journal.record(body_template.channel_name, body_template.arn, metadata_index, metadata,
+                            request_time, request_wall_time, response_time, result)
 
-                metadata_index += 1
 
-                # Correct send_interval according to delay time of request->response
-                time_correction = helper.time_correction(request_time, response_time)
+def get_body_templates(settings: data.AppSettings, channels: dict) -> dict:
+    """Returns {arn: BodyTemplate} for all channels of a run"""
+    if settings.pack_rate > 0:
+        # Logical events at pack_rate per channel, coalesced into one payload per send
+        return {arn: payload.PackedBodyTemplate(arn, settings.metadata_message, name, settings.pack_rate,
+                                                settings.metadata_start_index)
+                for name, arn in channels.items()}
+    return {arn: payload.BodyTemplate(arn, settings.metadata_message, name) for name, arn in channels.items()}
 
-                corrected_send_interval = max(send_interval - time_correction,
-                                              0)  # this also ensures that the result >=0
 
-                for _ in range(int(corrected_send_interval / check_interval)):
-                    if window.stop_flag:
-                        break
-                    time.sleep(check_interval)
+def sign_request(route: regions.Route, settings: data.AppSettings, body: bytes) -> dict:
+    """Headers of a PutMetadata request, SigV4 signed for the channel's region"""
+    return {**settings.headers, **route.signer.sign("POST", route.url, body)}
 
-        finally:
-            window.write_to_log("Stopped")
-            window.stop_action()
 
+def get_transport(settings: data.AppSettings, region: str = regions.DEFAULT_REGION,
+                  pool_size: int = None) -> transport.PooledTransport:
+    pool_config = (pool_size or settings.pool_size, settings.max_retries, settings.retry_backoff)
+    http = _transports.get(region)
+
+    # Recreate transport only if its pool/retry configuration was changed
+    if http is not None and not http.matches(*pool_config):
+        http.close()
+        http = None
 
-def create_auth_instance(access_key, secret_access_key, session_token) -> AWSRequestsAuth:
-    auth = AWSRequestsAuth(
-        aws_access_key=access_key,
-        aws_secret_access_key=secret_access_key,
-        aws_token=session_token,
-        aws_host="ivs.us-west-2.amazonaws.com",
-        aws_region="us-west-2",
-        aws_service="ivs"
-    )
-    return auth
+    if http is None:
+        http = _transports[region] = transport.PooledTransport(*pool_config)
+    return http
+
+
+def close_transport() -> None:
+    """Closes connection pools of all regions"""
+    for http in _transports.values():
+        http.close()
+    _transports.clear()
 
 
 def main(window: MainTab, settings: data.AppSettings) -> None:
-    if settings.credentials is not None:
+    # Only pasted credentials have to be there before the run, other sources are read on start
+    if settings.credentials is not None or settings.credential_source != "pasted":
         send_metadata(window, settings)
     else:
         window.write_to_log(f"{data.WARNING_PREFIX}Please provide credentials")
         window.stop_action(window.json_entry)
 
 
-def get_message_from_response(response, window: MainTab) -> str:
-    if response.text:
-        try:
-            response_text_json = json.loads(response.text, strict=False)
-
-            # Convert all keys to lowercase for case-insensitive matching
-            lowercase_data = {key.lower(): value for key, value in response_text_json.items()}
-
-            # Try to get the value associated with the key 'message'
-            message = lowercase_data.get('message')
-            cleared_message = f"{data.WARNING_PREFIX}{helper.remove_from_newline(message)}"
-
-            if cleared_message is not None:
-                window.stop_action()
-                return cleared_message
-            else:
-                window.stop_action()
-                return f"{data.WARNING_PREFIX}No message found in the response."
-        except json.JSONDecodeError as e:
-            window.stop_action()
-            return f"{data.WARNING_PREFIX}Error decoding response.text JSON: {e}"
-    else:
-        return f"{json.loads(response.request.body.decode('utf-8'))['metadata']}"
+def get_send_result(response, metadata: str) -> data.SendResult:
+    """Success is decided by status code alone and logged with the sent metadata,
+    the body is decoded only for errors"""
+    status = response.status_code
+    if responses.is_success(status):
+        return data.SendResult(metadata, status)
+    return data.SendResult(responses.get_error_message(response.content), status,
+                           responses.get_error_class(status, response.headers))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,146 @@
+import asyncio
+import time
+from contextlib import AsyncExitStack
+import aiohttp
+import api_calls
+import data
+import fanout
+import journal
+import payload
+import profiling
+import ratelimit
+import regions
+import responses
+
+
+def run(window, settings: data.AppSettings, channels: dict, router: regions.Router,
+        send_journal: journal.SendJournal or None = None) -> None:
+    """Sends metadata with up to settings.max_in_flight PutMetadata requests
+    pipelined per run. Results are still written to the log in index order"""
+    states = fanout.new_channel_states(window, settings, channels)
+    asyncio.run(_run_channels(window, settings, states, router, send_journal))
+
+    # Summary of each channel's stream (in fan-out or if there were retries)
+    for state in states:
+        if len(states) > 1 or state.rate.retries:
+            window.write_to_log(state.summary())
+
+
+async def _run_channels(window, settings: data.AppSettings, states: list, router: regions.Router,
+                        send_journal: journal.SendJournal or None) -> None:
+    buckets = ratelimit.from_settings(settings, [state.arn for state in states])
+    in_flight = asyncio.Semaphore(settings.max_in_flight)
+    body_templates = api_calls.get_body_templates(settings, {state.name: state.arn for state in states})
+
+    timeout = aiohttp.ClientTimeout(total=settings.request_timeout)
+    async with AsyncExitStack() as stack:
+        # Own session (connection pool) per region, so regions don't wait for each other's connections
+        sessions = {}
+        for region in router.regions:
+            connector = aiohttp.TCPConnector(limit=settings.max_in_flight, keepalive_timeout=60)
+            sessions[region] = await stack.enter_async_context(aiohttp.ClientSession(connector=connector,
+                                                                                     timeout=timeout))
+
+        channel_tasks = []
+        for state in states:
+            route = router.route(state.arn)
+            channel_tasks.append(asyncio.create_task(_run_channel(window, settings, sessions[route.region], route,
+                                                                  send_journal, body_templates[state.arn], state,
+                                                                  buckets[state.arn], in_flight)))
+        await fanout.run_until_stopped(window.stop_event, channel_tasks)
+
+
+async def _run_channel(window, settings: data.AppSettings, session: aiohttp.ClientSession,
+                       route: regions.Route, send_journal: journal.SendJournal or None,
+                       body_template: payload.BodyTemplate, state: fanout.ChannelState,
+                       bucket: ratelimit.TokenBucket, in_flight: asyncio.Semaphore) -> None:
+    # Completed log lines waiting for earlier indexes to be logged first
+    completed = {}
+    next_to_log = state.index
+
+    def log_in_order(metadata_index: int, log_line: str or None) -> None:
+        nonlocal next_to_log
+        completed[metadata_index] = log_line
+        while next_to_log in completed:
+            log_line = completed.pop(next_to_log)
+            if log_line is not None:
+                window.write_to_log(log_line)
+            next_to_log += 1
+
+    async def send(metadata_index: int, metadata: str or None, lateness_note: str) -> None:
+        try:
+            while True:
+                result = await post_metadata(window, send_journal, session, route, settings,
+                                             body_template, metadata_index, metadata)
+                retry_delay = state.rate.handle(result, state.schedule, metadata_index)
+                if retry_delay is None:
+                    break
+
+                # Retry notices are logged right away, final results in index order
+                with profiling.phase("log"):
+                    window.write_to_log(state.log_line(result))
+                await asyncio.sleep(retry_delay)
+                await asyncio.sleep(bucket.reserve())
+        finally:
+            in_flight.release()
+
+        if result.failed:
+            # Error stops the channel, requests already in flight still get logged
+            state.errors += 1
+            state.last_error = result.message
+            state.active = False
+            window.metrics.record_failure()
+        else:
+            state.sent += 1
+        with profiling.phase("log"):
+            log_in_order(metadata_index, state.log_line(result, lateness_note))
+
+    requests_in_flight = set()
+    try:
+        while state.active and await state.schedule.async_wait_next():
+            lateness_note = state.schedule.lateness_note()
+            await asyncio.sleep(bucket.reserve())
+            await in_flight.acquire()
+            if not state.active:
+                in_flight.release()
+                break
+
+            task = asyncio.create_task(send(state.index, state.schedule.metadata, lateness_note))
+            requests_in_flight.add(task)
+            task.add_done_callback(requests_in_flight.discard)
+            state.index += 1
+    finally:
+        # Let pipelined requests finish so every sent index gets logged
+        if requests_in_flight:
+            await asyncio.gather(*requests_in_flight, return_exceptions=True)
+
+
+async def post_metadata(window, send_journal: journal.SendJournal or None, session: aiohttp.ClientSession,
+                        route: regions.Route, settings: data.AppSettings, body_template: payload.BodyTemplate,
+                        metadata_index: int, metadata: str or None) -> data.SendResult:
+    # Rendered per attempt, so timestamps in the metadata are those of the actual send
+    with profiling.phase("render"):
+        body, metadata = body_template.render(metadata_index, metadata)
+    with profiling.phase("sign"):
+        headers = api_calls.sign_request(route, settings, body)
+
+    request_time = time.monotonic()
+    request_wall_time = time.time()
+    try:
+        # Wall time of the request, includes waiting for the event loop while other requests are handled
+        with profiling.phase("http"):
+            async with session.post(route.url, data=body, headers=headers) as response:
+                response_body = await response.read()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        result = data.SendResult(f"{type(e).__name__}: {e}", None, type(e).__name__)
+    else:
+        with profiling.phase("parse"):
+            if responses.is_success(response.status):
+                result = data.SendResult(metadata, response.status)
+            else:
+                result = data.SendResult(responses.get_error_message(response_body), response.status,
+                                         responses.get_error_class(response.status, response.headers))
+
+    api_calls.record_send(window, send_journal, body_template, metadata_index, metadata, request_time,
+                          request_wall_time, result)
+    return result
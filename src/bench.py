@@ -0,0 +1,163 @@
+"""Offline benchmark of the send engine against the local PutMetadata stand-in.
+
+For each engine mode measures achieved sends per second, request latency,
+timing drift of received cues against their ideal schedule and client CPU
+time per message (worker processes of the *-processes modes included). The
+stand-in runs in a separate process, so CPU numbers contain only the sending side.
+Sends stay within the IVS rate limits of settings.json as in a real run, so the
+defaults (30 channels at 5 msg/s) load the account limit without going over it:
+
+    python bench.py --duration 10 --interval 0.2 --latency 20 --channels 30
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import requests
+import api_calls
+import cli
+import data
+import mock_ivs
+
+# (mode name, engine, fan-out, channels split across worker processes)
+MODES = (
+    ("sync", "sync", False, False),
+    ("sync-fanout", "sync", True, False),
+    ("async", "async", False, False),
+    ("async-fanout", "async", True, False),
+    ("sync-processes", "sync", True, True),
+    ("async-processes", "async", True, True),
+)
+
+
+class BenchWindow(cli.ConsoleWindow):
+    """Console window that only counts warnings instead of printing every send"""
+
+    def write_to_log(self, msg: str) -> None:
+        if msg.startswith(data.WARNING_PREFIX):
+            self.warnings_count += 1
+
+
+def serve_mock(config: mock_ivs.MockConfig, port_queue: multiprocessing.Queue) -> None:
+    server = mock_ivs.MockIVSServer(("127.0.0.1", 0), config)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_mock_process(config: mock_ivs.MockConfig) -> tuple:
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve_mock, args=(config, port_queue), daemon=True)
+    process.start()
+    port = port_queue.get(timeout=10)
+    return process, f"http://127.0.0.1:{port}"
+
+
+def compute_drift(received: list, interval: float) -> dict:
+    """Drift of each received cue against start + N * interval of its channel, ms"""
+    drifts = []
+    by_channel = {}
+    for receive_time, arn, metadata in received:
+        by_channel.setdefault(arn, []).append((int(metadata.rsplit("_", 1)[1]), receive_time))
+
+    for cues in by_channel.values():
+        cues.sort()
+        first_index, first_time = cues[0]
+        drifts += [(receive_time - first_time - (index - first_index) * interval) * 1000
+                   for index, receive_time in cues]
+
+    if not drifts:
+        return {"final_ms": 0.0, "max_abs_ms": 0.0}
+    return {"final_ms": round(drifts[-1], 3), "max_abs_ms": round(max(abs(drift) for drift in drifts), 3)}
+
+
+def cpu_times() -> float:
+    """CPU time of this process and its finished children (the stand-in is still running, so it's not counted)"""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def run_mode(mode: tuple, args: argparse.Namespace, server_base_url: str) -> dict:
+    name, engine, fanout, sharded = mode
+    settings = data.AppSettings
+    settings.engine = engine
+    settings.processes = args.processes if sharded else 1
+    settings.endpoint_url = f"{server_base_url}/PutMetadata"
+    settings.wait = args.interval
+    settings.send_duration = args.duration
+    settings.send_count = 0
+    settings.max_in_flight = args.in_flight
+    settings.metadata_start_index = 1
+    channels_count = args.channels if fanout else 1
+    settings.arns = {f"bench{i}": f"arn:aws:ivs:us-west-2:000000000000:channel/bench{i}"
+                     for i in range(channels_count)}
+    settings.credentials = {"accessKeyId": "AKIDBENCH", "secretAccessKey": "bench",
+                            "sessionToken": "bench", "expiration": "2099-01-01 00:00:00"}
+
+    requests.post(f"{server_base_url}/_reset")
+    window = BenchWindow("bench0", fanout)
+
+    cpu_start = cpu_times()
+    api_calls.main(window, settings)
+    cpu_time = cpu_times() - cpu_start
+
+    stats = requests.get(f"{server_base_url}/_stats").json()
+    send_metrics = window.metrics.to_dict()
+    sent = send_metrics["sent"]
+    return {
+        "mode": name,
+        "sent": sent,
+        "rate_per_sec": send_metrics["rate_per_sec"],
+        "latency_p50_ms": send_metrics["latency"]["p50_ms"],
+        "latency_p99_ms": send_metrics["latency"]["p99_ms"],
+        "drift": compute_drift(stats["received"], args.interval),
+        "cpu_us_per_msg": round(cpu_time / sent * 1e6, 1) if sent else 0.0,
+        "errors": window.warnings_count,
+    }
+
+
+def print_results(results: list) -> None:
+    header = f"{'mode':<17}{'sent':>7}{'msg/s':>9}{'p50 ms':>9}{'p99 ms':>9}" \
+             f"{'drift ms':>10}{'|max| ms':>10}{'cpu us/msg':>12}{'errors':>8}"
+    print(header)
+    for result in results:
+        print(f"{result['mode']:<17}{result['sent']:>7}{result['rate_per_sec']:>9.2f}"
+              f"{result['latency_p50_ms']:>9.2f}{result['latency_p99_ms']:>9.2f}"
+              f"{result['drift']['final_ms']:>10.2f}{result['drift']['max_abs_ms']:>10.2f}"
+              f"{result['cpu_us_per_msg']:>12.1f}{result['errors']:>8}")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark send engine modes against local PutMetadata stand-in")
+    parser.add_argument("--duration", type=float, default=5, help="seconds per mode")
+    parser.add_argument("--interval", type=float, default=0.2, help="seconds between messages per channel")
+    parser.add_argument("--channels", type=int, default=30, help="channels in fan-out modes")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 2,
+                        help="worker processes in *-processes modes (default: CPU count)")
+    parser.add_argument("--in-flight", type=int, default=8, help="max in-flight requests of async engine")
+    parser.add_argument("--latency", type=float, default=20, help="stand-in response latency, ms")
+    parser.add_argument("--jitter", type=float, default=0, help="stand-in random extra latency, ms")
+    parser.add_argument("--modes", nargs="+", choices=[mode[0] for mode in MODES], help="modes to run (default: all)")
+    parser.add_argument("--json", help="also write results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    config = mock_ivs.MockConfig(latency=args.latency / 1000, jitter=args.jitter / 1000)
+    process, server_base_url = start_mock_process(config)
+
+    try:
+        modes = [mode for mode in MODES if not args.modes or mode[0] in args.modes]
+        results = [run_mode(mode, args, server_base_url) for mode in modes]
+    finally:
+        api_calls.close_transport()
+        process.terminate()
+
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == '__main__':
+    main()
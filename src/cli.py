@@ -0,0 +1,255 @@
+"""Headless runner of the metadata send loop.
+
+Uses the same send engine and settings.json as the GUI, but doesn't import tkinter,
+so it can run on CI boxes and lab hosts without a display:
+
+    python cli.py --channel MyChannel --rate 0.5 --count 100
+    python cli.py --all-channels --duration 3600 --message cue
+    python cli.py --control-port 8765
+"""
+import argparse
+import os
+import signal
+import sys
+import threading
+import api_calls
+import control
+import data
+import exporter
+import helper
+import metrics
+import payload
+import schedules
+
+
+class Value:
+    """Minimal stand-in for tkinter variables read by the send engine"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value) -> None:
+        self.value = value
+
+
+class ConsoleWindow:
+    """Stand-in for MainTab: logs to stdout/stderr and handles start/stop requests"""
+
+    def __init__(self, channel_name: str, all_channels: bool):
+        self.selected_arn = Value(channel_name)
+        self.all_channels = Value(all_channels)
+        self.running_thread = None
+        self.thread_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.metrics = metrics.SendMetrics()
+        self.run_credentials = None
+        self.json_entry = None
+        self.warnings_count = 0
+
+    @property
+    def selected_channel_name(self) -> str:
+        return self.selected_arn.get()
+
+    @property
+    def all_channels_selected(self) -> bool:
+        return bool(self.all_channels.get())
+
+    def write_to_log(self, msg: str) -> None:
+        if msg.startswith(data.WARNING_PREFIX):
+            self.warnings_count += 1
+            print(f"{helper.now_datetime()} {msg[len(data.WARNING_PREFIX):]}", file=sys.stderr, flush=True)
+        else:
+            print(f"{helper.now_datetime()} {msg}", flush=True)
+
+    def start_action(self, send_count: int = 0, send_duration: float = 0) -> None:
+        settings = data.AppSettings
+        with self.thread_lock:
+            if self.running_thread is None or not self.running_thread.is_alive():
+                settings.send_count = send_count
+                settings.send_duration = send_duration
+                # Each run gets its own event, set by a stop meant for it only
+                self.stop_event = threading.Event()
+                self.metrics = metrics.SendMetrics()
+                # Engine runs in a worker thread as in GUI; main thread stays free to handle signals
+                self.running_thread = threading.Thread(target=api_calls.main, args=(self, settings))
+                self.running_thread.start()
+
+    def stop_action(self, widget_to_focus=None) -> None:
+        self.stop_event.set()
+
+    def set_delay(self, delay: float) -> None:
+        data.AppSettings.wait = delay
+
+
+def run_failed(window: ConsoleWindow) -> bool:
+    """A send failed for good (retried sends that went through don't count),
+    or the run logged warnings without getting a single message through"""
+    send_metrics = window.metrics
+    succeeded = send_metrics.sent - sum(send_metrics.errors.values())
+    return bool(send_metrics.failures or (window.warnings_count and not succeeded))
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Sequential Metadata Sending Tool (headless)")
+    channel_group = parser.add_mutually_exclusive_group()
+    channel_group.add_argument("--channel", help="name of saved channel (default: first saved channel)")
+    channel_group.add_argument("--all-channels", action="store_true", help="send to all saved channels at once")
+    parser.add_argument("--rate", type=float, help="messages per second per channel (default: 1 / 'wait' from settings)")
+    parser.add_argument("--schedule", help="send pattern, e.g. burst:size=5,spacing=0.05, linear:from=1,to=10,over=60, "
+                                           "step:from=1,to=10,steps=4,every=30, poisson:rate=2, replay:timeline.tsv "
+                                           "(default: 'schedule' from settings)")
+    parser.add_argument("--count", type=int, default=0, help="stop after N messages per channel (0 = unlimited)")
+    parser.add_argument("--duration", type=float, default=0, help="stop after N seconds (0 = unlimited)")
+    parser.add_argument("--message", help="metadata message (index is appended to it) or template with "
+                                          "${index}, ${mono_ms}, ${wall_ms}, ${channel}, ${rand} placeholders")
+    parser.add_argument("--index", type=int, help="start index")
+    parser.add_argument("--pack-rate", type=float,
+                        help="generate logical events at N per second per channel and pack those due into "
+                             "one payload per send, up to 1 KB (0 = off, default: 'pack_rate' from settings)")
+    parser.add_argument("--credentials", help="credentials JSON string (default: saved credentials)")
+    parser.add_argument("--credential-source", help="'pasted' (saved/--credentials), 'file:<path>' (re-read on change) "
+                                                    "or 'command:<command line>' (run again before expiry)")
+    parser.add_argument("--metrics-out", help="export send metrics at stop (.json or .csv)")
+    parser.add_argument("--journal", help="append a JSON Lines record of every request to this file")
+    parser.add_argument("--profile-phases", action="store_true",
+                        help="log per-phase timing (render, sign, http, parse, log) at stop")
+    parser.add_argument("--cprofile", help="write cProfile stats of the run to this file")
+    parser.add_argument("--processes", type=int,
+                        help="split --all-channels across N worker processes (default: 'processes' from settings)")
+    parser.add_argument("--soak", action="store_true",
+                        help="long-run mode: don't log each send, log counters and memory growth every 'soak_window' s")
+    parser.add_argument("--soak-out", help="append soak windows to this JSON Lines file (implies --soak)")
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve Prometheus/OpenMetrics metrics at /metrics on this port of 'metrics_host' "
+                             "(0 = off, default: 'metrics_port' from settings)")
+    parser.add_argument("--control-port", type=int,
+                        help="don't start a run, serve the control API (start, stop, status, rate, channel) "
+                             "on this port of 'control_host' until Ctrl+C ('control_port' from settings "
+                             "applies to the GUI only)")
+    parser.add_argument("--endpoint-url", help="PutMetadata URL override of all regions (e.g. local stand-in server), "
+                                               "{region} is replaced with the channel's region")
+    return parser.parse_args(argv)
+
+
+def apply_args(args: argparse.Namespace, settings: data.AppSettings, window: ConsoleWindow) -> str or None:
+    """Applies command line values to settings. Returns error message if arguments are not usable"""
+    if not settings.arns:
+        return "No saved channels in settings.json"
+    if args.channel is not None and args.channel not in settings.arns:
+        return f"Unknown channel: {args.channel}"
+    if args.rate is not None:
+        if args.rate <= 0:
+            return "--rate must be positive"
+        settings.wait = 1 / args.rate
+    if args.pack_rate is not None:
+        if args.pack_rate < 0:
+            return "--pack-rate can't be negative"
+        settings.pack_rate = args.pack_rate
+    if args.message is not None:
+        try:
+            channel_names = settings.arns if args.all_channels else (window.selected_arn.get(),)
+            payload.validate_template(args.message, channel_names, settings.pack_rate > 0)
+        except payload.TemplateError as e:
+            return str(e)
+        settings.metadata_message = args.message
+    if args.index is not None:
+        settings.metadata_start_index = args.index
+    if args.schedule is not None:
+        settings.schedule = args.schedule
+    try:
+        schedules.validate_spec(settings.schedule, settings.wait)
+    except schedules.ScheduleError as e:
+        return str(e)
+    if args.endpoint_url is not None:
+        settings.endpoint_url = args.endpoint_url
+    if args.control_port is not None:
+        if not 0 <= args.control_port <= 65535:
+            return "--control-port must be between 0 and 65535"
+        settings.control_port = args.control_port
+    if args.metrics_port is not None:
+        if not 0 <= args.metrics_port <= 65535:
+            return "--metrics-port must be between 0 and 65535"
+        settings.metrics_port = args.metrics_port
+    if args.journal is not None:
+        settings.journal_path = os.path.abspath(args.journal)
+    if args.processes is not None:
+        if args.processes < 1:
+            return "--processes must be at least 1"
+        settings.processes = args.processes
+    if args.soak or args.soak_out:
+        settings.soak_mode = True
+    if args.soak_out is not None:
+        settings.soak_path = os.path.abspath(args.soak_out)
+    if args.profile_phases:
+        settings.profile_phases = True
+    if args.cprofile is not None:
+        settings.profile_path = os.path.abspath(args.cprofile)
+    settings.send_count = args.count
+    settings.send_duration = args.duration
+
+    if args.credential_source is not None:
+        settings.credential_source = args.credential_source
+    if args.credentials is not None:
+        settings.credentials = helper.get_credentials_form_json_string(args.credentials, window)
+        if settings.credentials is None:
+            return "Credentials were not applied"
+    return None
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    # Recall app settings
+    settings = data.AppSettings
+    settings.from_file()
+
+    channel_name = args.channel or next(iter(settings.arns or {}), None)
+    window = ConsoleWindow(channel_name, args.all_channels)
+
+    error = apply_args(args, settings, window)
+    if error:
+        print(error, file=sys.stderr)
+        return 2
+
+    # Stop cleanly on Ctrl+C / kill
+    shutdown_event = threading.Event()
+
+    def on_signal(signum, frame):
+        window.write_to_log(f"Received {signal.Signals(signum).name}, stopping")
+        shutdown_event.set()
+        window.stop_action()
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+
+    metrics_exporter = exporter.from_settings(window, settings)
+
+    # Only on request: a control_port saved by the GUI must not turn plain headless runs into a server
+    if args.control_port:
+        # Runs are started over the control API, the process serves it until Ctrl+C / kill
+        control_server = control.from_settings(window, settings)
+        if control_server is None:
+            return 2
+        while not shutdown_event.wait(0.2):
+            pass
+        control_server.stop()
+        window.stop_action()
+    else:
+        window.start_action(settings.send_count, settings.send_duration)
+    while window.running_thread is not None and window.running_thread.is_alive():
+        window.running_thread.join(0.2)
+    if metrics_exporter is not None:
+        metrics_exporter.stop()
+
+    print(window.metrics.summary(), flush=True)
+    if args.metrics_out:
+        window.metrics.export(args.metrics_out)
+
+    return 1 if run_failed(window) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,291 @@
+"""Local control API: start, stop and retune runs from test automation.
+
+With 'control_port' set, http://<control_host>:<control_port>/ accepts JSON commands
+and drives the same window (Main tab or cli.ConsoleWindow) as the Start/Stop buttons,
+so the GUI shows runs started over the API as if they were started by hand:
+
+    GET  /status                      run state, channel, rate and counters of the current run
+    POST /start    {"channel": "A", "all_channels": false, "rate": 2, "count": 0, "duration": 0}
+                                      starts a run, all fields optional (count/duration 0 = unlimited)
+    POST /stop                        stops the run, returns when nothing is sent anymore
+    POST /rate     {"rate": 5}        messages per second per channel, a running send loop
+                                      follows it from the next send
+    POST /channel  {"channel": "B"}   selects channel ({"all_channels": true} = fan-out),
+                                      a running run is restarted on it
+
+Every command returns the status JSON; errors return {"error": "..."} with 400
+(bad command), 404 (unknown path) or 409 (conflicting run state).
+"""
+import json
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import data
+
+# Seconds to wait for Tk main loop to run a command
+UI_CALL_TIMEOUT = 5.0
+
+# Extra seconds to wait for a stopped run to finish its last request
+STOP_GRACE = 5.0
+
+MAX_BODY_BYTES = 64 * 1024
+
+
+class ControlError(Exception):
+    """Command can't be carried out, status is the HTTP status returned to the client"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def direct_call(function, *args):
+    return function(*args)
+
+
+def queued_caller(call_queue: queue.Queue):
+    """Returns call(function, *args) running function on Tk main loop and returning its result.
+    Only puts it on call_queue from other threads, the main loop takes it off the queue"""
+
+    def call(function, *args):
+        if threading.current_thread() is threading.main_thread():
+            return function(*args)
+        done = threading.Event()
+        outcome = []
+
+        def run() -> None:
+            try:
+                outcome.append((function(*args), None))
+            except Exception as e:
+                outcome.append((None, e))
+            finally:
+                done.set()
+
+        call_queue.put(run)
+        if not done.wait(UI_CALL_TIMEOUT):
+            raise ControlError("GUI didn't respond", 503)
+        result, error = outcome[0]
+        if error is not None:
+            raise error
+        return result
+
+    return call
+
+
+def positive_number(value, name: str) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+        raise ControlError(f"'{name}' must be a positive number")
+    return value
+
+
+def limit(value, name: str) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise ControlError(f"'{name}' must be a number, 0 = unlimited")
+    return value
+
+
+class Controller:
+    """Commands of the control API. Widgets are only touched through call (Tk main loop in GUI),
+    status reads plain window attributes, waiting for a run to end happens on the calling (HTTP) thread"""
+
+    def __init__(self, window, settings: data.AppSettings, call=direct_call):
+        self.window = window
+        self.settings = settings
+        self.call = call
+        # One command at a time, e.g. a stop can't slip in between stop and start of a channel switch
+        self.lock = threading.Lock()
+
+    def running_thread(self) -> threading.Thread or None:
+        thread = self.window.running_thread
+        return thread if thread is not None and thread.is_alive() else None
+
+    def status(self) -> dict:
+        send_metrics = self.window.metrics
+        snapshot = send_metrics.peek() if send_metrics is not None else None
+        return {
+            "running": self.running_thread() is not None and not self.window.stop_event.is_set(),
+            "channel": self.window.selected_channel_name,
+            "all_channels": self.window.all_channels_selected,
+            "channels": list(self.settings.arns or {}),
+            "rate": 1 / self.settings.wait if self.settings.wait else 0.0,
+            "sent": snapshot.sent if snapshot else 0,
+            "errors": sum(snapshot.errors.values()) if snapshot else 0,
+            "rate_per_sec": round(snapshot.rate(), 3) if snapshot else 0.0,
+        }
+
+    def start(self, command: dict) -> dict:
+        with self.lock:
+            if self.running_thread() is not None:
+                raise ControlError("A run is already going on", 409)
+            if not self.settings.arns:
+                raise ControlError("No saved channels")
+            if self.settings.credentials is None and self.settings.credential_source == "pasted":
+                raise ControlError("Please provide credentials")
+            # Whole command is checked before anything is changed
+            send_count = limit(command.get("count", 0), "count")
+            send_duration = limit(command.get("duration", 0), "duration")
+            selects = "channel" in command or "all_channels" in command
+            if selects:
+                self.select(command, validate_only=True)
+            if "rate" in command:
+                self.set_rate(command["rate"])
+            if selects:
+                self.select(command)
+            self.call(self.window.start_action, int(send_count), send_duration)
+            self.window.write_to_log("Control API: started")
+            return self.status()
+
+    def stop(self, command: dict = None) -> dict:
+        with self.lock:
+            self.stop_run()
+            return self.status()
+
+    def rate(self, command: dict) -> dict:
+        with self.lock:
+            if "rate" not in command:
+                raise ControlError("'rate' is missing")
+            self.set_rate(command["rate"])
+            return self.status()
+
+    def channel(self, command: dict) -> dict:
+        with self.lock:
+            if "channel" not in command and "all_channels" not in command:
+                raise ControlError("'channel' or 'all_channels' is missing")
+            if self.running_thread() is None:
+                self.select(command)
+                return self.status()
+            # Channels of a run are fixed when it starts: restart it on the new selection
+            self.select(command, validate_only=True)
+            self.stop_run()
+            self.select(command)
+            self.call(self.window.start_action, self.settings.send_count, self.settings.send_duration)
+            self.window.write_to_log("Control API: restarted on new channel selection")
+            return self.status()
+
+    def stop_run(self) -> None:
+        thread = self.running_thread()
+        self.call(self.window.stop_action)
+        if thread is not None:
+            thread.join(self.settings.request_timeout + STOP_GRACE)
+            if thread.is_alive():
+                raise ControlError("Run didn't stop in time", 503)
+
+    def select(self, command: dict, validate_only: bool = False) -> None:
+        channel = command.get("channel")
+        all_channels = command.get("all_channels", False)
+        if channel is not None and channel not in (self.settings.arns or {}):
+            raise ControlError(f"Unknown channel: {channel}")
+        if not isinstance(all_channels, bool):
+            raise ControlError("'all_channels' must be true or false")
+        if validate_only:
+            return
+
+        def apply() -> None:
+            if channel is not None:
+                self.window.selected_arn.set(channel)
+            self.window.all_channels.set(all_channels)
+
+        self.call(apply)
+        self.window.write_to_log(f"Control API: channel {'all' if all_channels else self.window.selected_channel_name}")
+
+    def set_rate(self, rate) -> None:
+        delay = 1 / positive_number(rate, "rate")
+        self.call(self.window.set_delay, delay)
+        self.window.write_to_log(f"Control API: rate {rate:g} msg/s")
+
+    def handle(self, method: str, path: str, command: dict) -> dict:
+        """Runs the command of a request, raises ControlError"""
+        match method, path:
+            case "GET", "/status":
+                return self.status()
+            case "POST", "/start":
+                return self.start(command)
+            case "POST", "/stop":
+                return self.stop(command)
+            case "POST", "/rate":
+                return self.rate(command)
+            case "POST", "/channel":
+                return self.channel(command)
+            case _, "/status" | "/start" | "/stop" | "/rate" | "/channel":
+                raise ControlError(f"{method} is not allowed on {path}", 405)
+        raise ControlError(f"Unknown command: {path}", 404)
+
+
+class ControlHandler(BaseHTTPRequestHandler):
+    server_version = "smst-control"
+
+    def do_GET(self) -> None:
+        self.run_command()
+
+    def do_POST(self) -> None:
+        self.run_command()
+
+    def run_command(self) -> None:
+        try:
+            command = self.read_command()
+            response, status = self.server.controller.handle(self.command, self.path.split("?", 1)[0], command), 200
+        except ControlError as e:
+            response, status = {"error": str(e)}, e.status
+        body = json.dumps(response).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_command(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise ControlError("Command is too large", 413)
+        if not length:
+            return {}
+        try:
+            command = json.loads(self.rfile.read(length))
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise ControlError(f"Command is not valid JSON: {e}") from None
+        if not isinstance(command, dict):
+            raise ControlError("Command must be a JSON object")
+        return command
+
+    def log_message(self, format, *args) -> None:
+        # Commands are logged by Controller
+        pass
+
+
+class ControlServer:
+    """HTTP server thread of the control API"""
+
+    def __init__(self, controller: Controller, host: str, port: int):
+        self.server = ThreadingHTTPServer((host, port), ControlHandler)
+        self.server.daemon_threads = True
+        self.server.controller = controller
+        self.thread = threading.Thread(target=self.server.serve_forever, name="control", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> "ControlServer":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+def from_settings(window, settings: data.AppSettings, call=direct_call) -> ControlServer or None:
+    """Returns a started control server, None if 'control_port' is 0 or the port can't be bound"""
+    if not settings.control_port:
+        return None
+    try:
+        server = ControlServer(Controller(window, settings, call), settings.control_host,
+                               settings.control_port).start()
+    except OSError as e:
+        window.write_to_log(f"{data.WARNING_PREFIX}Control API can't be opened on "
+                            f"{settings.control_host}:{settings.control_port}: {e}")
+        return None
+    window.write_to_log(f"Control API: {server.url}")
+    return server
@@ -0,0 +1,340 @@
+"""Offline correlator of sent cues with player logs: end-to-end latency, loss and reordering.
+
+Joins the send journal (journal_path / --journal) with player-side logs on the
+cue index and reports the latency distribution (player time - send time), lost
+cues, duplicates and cues shown out of order. Packed payloads (pack_rate) are
+split into their events, whose generation time is the send time. Files are read
+line by line (also .gz) into compact arrays and the join runs on NumPy arrays,
+so millions of cues fit in a few hundred MB:
+
+    python correlate.py --sends journal.jsonl journal.jsonl.1 --player player.log --format jsonl
+    python correlate.py --sends journal.jsonl --player p.log --channel MyChannel \\
+        --format 'regex:^(?P<time>\\S+) .*cue=(?P<metadata>\\S+)'
+
+Player log formats (--format), each line gives a receive time and the received metadata:
+
+    jsonl              {"time": ..., "metadata": "..."[, "channel": "..."]} per line; time keys
+                       "time", "timestamp", "ts" or "t", metadata keys "metadata", "text", "cue" or "data"
+    tsv                "<time><tab or space><metadata>" per line (same as replay files)
+    regex:<pattern>    named groups "time" and "metadata", optional "channel"
+
+Times are Unix seconds or milliseconds (values above 1e11 are taken as ms) or ISO 8601.
+Other formats can be added with register_format() from a wrapper script.
+"""
+import argparse
+import gzip
+import json
+import re
+import sys
+from array import array
+from datetime import datetime
+import payload
+
+try:
+    import numpy as np
+except ImportError:
+    # Only this tool needs NumPy, the app itself doesn't
+    np = None
+
+# Cue index taken from the end of non-packed metadata, e.g. "testMetadata_42"
+DEFAULT_INDEX_PATTERN = r"(\d+)\D*$"
+
+# Join key is channel code * CHANNEL_KEY_SCALE + cue index
+CHANNEL_KEY_SCALE = 1 << 40
+
+PERCENTILES = (50, 90, 95, 99, 99.9)
+
+TIME_KEYS = ("time", "timestamp", "ts", "t")
+METADATA_KEYS = ("metadata", "text", "cue", "data")
+
+_formats = {}
+
+
+def register_format(name: str, parser) -> None:
+    """parser(line) -> (time in ms, channel name or None, metadata) or None to skip the line"""
+    _formats[name] = parser
+
+
+def parse_time_ms(value) -> float:
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp() * 1000
+    value = float(value)
+    return value if value > 1e11 else value * 1000
+
+
+def parse_jsonl_line(line: str):
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(record, dict):
+        return None
+    time_value = next((record[key] for key in TIME_KEYS if key in record), None)
+    metadata = next((record[key] for key in METADATA_KEYS if key in record), None)
+    if time_value is None or not isinstance(metadata, str):
+        return None
+    return parse_time_ms(time_value), record.get("channel"), metadata
+
+
+def parse_tsv_line(line: str):
+    line = line.rstrip("\r\n")
+    separator = "\t" if "\t" in line else " "
+    time_value, _, metadata = line.partition(separator)
+    if not metadata:
+        return None
+    return parse_time_ms(time_value), None, metadata
+
+
+def regex_parser(pattern: str):
+    compiled = re.compile(pattern)
+    if not {"time", "metadata"} <= set(compiled.groupindex):
+        raise ValueError("Regex format needs named groups 'time' and 'metadata'")
+    has_channel = "channel" in compiled.groupindex
+
+    def parse_regex_line(line: str):
+        match = compiled.search(line)
+        if match is None:
+            return None
+        return parse_time_ms(match["time"]), match["channel"] if has_channel else None, match["metadata"]
+
+    return parse_regex_line
+
+
+register_format("jsonl", parse_jsonl_line)
+register_format("tsv", parse_tsv_line)
+
+
+def get_format(name: str):
+    if name.startswith("regex:"):
+        return regex_parser(name[len("regex:"):])
+    if name not in _formats:
+        raise ValueError(f"Unknown player log format {name!r}, available: {', '.join(_formats)}, regex:<pattern>")
+    return _formats[name]
+
+
+def read_lines(path: str):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8", errors="replace") as file:
+        yield from file
+
+
+class CueColumns:
+    """Growing columns of (join key, time ms), kept in compact typed arrays until converted to NumPy"""
+
+    def __init__(self, channels: dict):
+        self.channels = channels
+        self.keys = array("q")
+        self.times = array("d")
+        self.skipped = 0
+
+    def channel_code(self, channel: str) -> int:
+        code = self.channels.get(channel)
+        if code is None:
+            code = self.channels[channel] = len(self.channels)
+        return code
+
+    def add(self, channel: str, index: int, time_ms: float) -> None:
+        self.keys.append(self.channel_code(channel) * CHANNEL_KEY_SCALE + index)
+        self.times.append(time_ms)
+
+    def to_numpy(self) -> tuple:
+        return np.frombuffer(self.keys, dtype=np.int64), np.frombuffer(self.times, dtype=np.float64)
+
+
+def cue_indexes(metadata: str, index_pattern) -> list:
+    """Cue indexes in received metadata: every event of a packed payload, else the index in the text"""
+    events = payload.unpack(metadata)
+    if events is not None:
+        return [index for index, _, _ in events]
+    match = index_pattern.search(metadata)
+    return [] if match is None else [int(match.group(1))]
+
+
+def read_sends(paths: list, columns: CueColumns, channel_filter: str or None) -> None:
+    """Successful sends of the journal; packed payloads contribute each event with its generation time"""
+    for path in paths:
+        for line in read_lines(path):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                columns.skipped += 1
+                continue
+            status = record.get("status")
+            if status is None or not 200 <= status < 300:
+                continue
+            channel = record.get("channel") or ""
+            if channel_filter is not None and channel != channel_filter:
+                continue
+            events = payload.unpack(record["metadata"])
+            if events is not None:
+                for index, wall_ms, _ in events:
+                    columns.add(channel, index, wall_ms)
+            else:
+                columns.add(channel, record["index"], record["request_wall"] * 1000)
+
+
+def read_player(paths: list, columns: CueColumns, parser, default_channel: str, index_pattern) -> None:
+    for path in paths:
+        for line in read_lines(path):
+            if not line.strip():
+                continue
+            try:
+                parsed = parser(line)
+            except (ValueError, TypeError, OverflowError):
+                parsed = None
+            if parsed is None:
+                columns.skipped += 1
+                continue
+            receive_ms, channel, metadata = parsed
+            indexes = cue_indexes(metadata, index_pattern)
+            if not indexes:
+                columns.skipped += 1
+            for index in indexes:
+                columns.add(channel or default_channel, index, receive_ms)
+
+
+def last_occurrence(keys, times) -> tuple:
+    """Keeps the last record of every key (a retried send), sorted by key"""
+    reversed_keys = keys[::-1]
+    unique_keys, positions = np.unique(reversed_keys, return_index=True)
+    return unique_keys, times[::-1][positions]
+
+
+def correlate(send_keys, send_times, player_keys, player_times, clock_offset_ms: float = 0.0) -> dict:
+    """Latency, loss, duplicates and reordering of cues (all arrays in ms, keys as built by CueColumns)"""
+    send_keys, send_times = last_occurrence(send_keys, send_times)
+
+    # First display of every cue; later ones are duplicates
+    order = np.argsort(player_times, kind="stable")
+    player_keys = player_keys[order]
+    player_times = player_times[order] - clock_offset_ms
+    shown_keys, first_positions = np.unique(player_keys, return_index=True)
+    shown_times = player_times[first_positions]
+    duplicates = len(player_keys) - len(shown_keys)
+
+    matched_keys, send_positions, shown_positions = np.intersect1d(send_keys, shown_keys, assume_unique=True,
+                                                                   return_indices=True)
+    latencies = shown_times[shown_positions] - send_times[send_positions]
+
+    # Sends after the last player line may still have been on the way when the log ended
+    observed_until = player_times[-1] if len(player_times) else -np.inf
+    expected = send_times <= observed_until
+    lost_mask = expected & ~np.isin(send_keys, shown_keys, assume_unique=True)
+    lost = int(lost_mask.sum())
+    expected_count = int(expected.sum())
+
+    # Reordering: in display order, a cue is late if a higher index of its channel was shown before it
+    display_order = np.argsort(shown_times[shown_positions], kind="stable")
+    ordered_keys = matched_keys[display_order]
+    channels = ordered_keys // CHANNEL_KEY_SCALE
+    reordered = 0
+    max_displacement = 0
+    for channel in np.unique(channels):
+        indexes = ordered_keys[channels == channel] % CHANNEL_KEY_SCALE
+        running_max = np.maximum.accumulate(indexes)
+        displacement = running_max - indexes
+        reordered += int((displacement > 0).sum())
+        if len(displacement):
+            max_displacement = max(max_displacement, int(displacement.max()))
+
+    result = {
+        "sent": len(send_keys),
+        "shown": len(shown_keys),
+        "matched": len(matched_keys),
+        "unknown_shown": int(len(shown_keys) - len(matched_keys)),
+        "duplicates": int(duplicates),
+        "lost": lost,
+        "loss_rate": round(lost / expected_count, 6) if expected_count else 0.0,
+        "reordered": reordered,
+        "max_reorder_distance": max_displacement,
+        "latency_ms": latency_stats(latencies),
+    }
+    return result
+
+
+def latency_stats(latencies) -> dict:
+    if not len(latencies):
+        return {"count": 0}
+    stats = {
+        "count": int(len(latencies)),
+        "negative": int((latencies < 0).sum()),
+        "min": round(float(latencies.min()), 3),
+        "mean": round(float(latencies.mean()), 3),
+        "stdev": round(float(latencies.std()), 3),
+        "max": round(float(latencies.max()), 3),
+    }
+    for p, value in zip(PERCENTILES, np.percentile(latencies, PERCENTILES)):
+        stats[f"p{p:g}"] = round(float(value), 3)
+    return stats
+
+
+def print_report(result: dict) -> None:
+    latency = result["latency_ms"]
+    print(f"Sent cues: {result['sent']}   shown: {result['shown']}   matched: {result['matched']}   "
+          f"unknown: {result['unknown_shown']}   duplicates: {result['duplicates']}")
+    print(f"Lost: {result['lost']} ({result['loss_rate']:.3%})   reordered: {result['reordered']} "
+          f"(max distance {result['max_reorder_distance']})")
+    if latency["count"]:
+        print("Latency ms: " + "  ".join(f"{name} {value:.1f}" for name, value in latency.items()
+                                         if name not in ("count", "negative")))
+        if latency["negative"]:
+            print(f"{latency['negative']} cues were shown before they were sent, "
+                  f"check clocks or use --clock-offset-ms")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Correlate sent cues with player logs (latency, loss, reordering)")
+    parser.add_argument("--sends", nargs="+", required=True, help="send journal files (JSON Lines, .gz allowed)")
+    parser.add_argument("--player", nargs="+", required=True, help="player log files (.gz allowed)")
+    parser.add_argument("--format", default="jsonl", help="player log format: jsonl, tsv or regex:<pattern>")
+    parser.add_argument("--channel", help="use only sends of this channel; also the channel of player lines "
+                                          "without one (default: the only channel in the journal)")
+    parser.add_argument("--index-pattern", default=DEFAULT_INDEX_PATTERN,
+                        help="regex with the cue index as group 1, for non-packed player metadata")
+    parser.add_argument("--clock-offset-ms", type=float, default=0.0,
+                        help="player clock minus sender clock, subtracted from player times")
+    parser.add_argument("--json", help="also write results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if np is None:
+        print("correlate.py needs NumPy: pip install numpy", file=sys.stderr)
+        return 2
+    try:
+        player_parser = get_format(args.format)
+        index_pattern = re.compile(args.index_pattern)
+    except (ValueError, re.error) as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    channels = {}
+    sends = CueColumns(channels)
+    read_sends(args.sends, sends, args.channel)
+
+    default_channel = args.channel
+    if default_channel is None:
+        if len(channels) > 1:
+            print(f"Journal has {len(channels)} channels ({', '.join(channels)}), select one with --channel",
+                  file=sys.stderr)
+            return 2
+        default_channel = next(iter(channels), "")
+    player = CueColumns(channels)
+    read_player(args.player, player, player_parser, default_channel, index_pattern)
+    if player.skipped:
+        print(f"Skipped {player.skipped} player log lines without time or cue index", file=sys.stderr)
+
+    result = correlate(*sends.to_numpy(), *player.to_numpy(), args.clock_offset_ms)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(result, file, indent=4)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,294 @@
+"""Credential providers and hot-swap of credentials into a running send engine.
+
+Credential source (settings "credential_source" / CLI --credential-source):
+
+    pasted                  credentials pasted in Main tab (or --credentials), re-read when pasted again
+    file:/path/creds.json   JSON file, re-read whenever it changes
+    command:<command line>  local command printing credentials JSON, run again before expiry
+
+Accepted JSON: the pasted format {"credentials": {"accessKeyId", "secretAccessKey",
+"sessionToken", "expiration": <epoch ms>}} and the AWS credential_process /
+STS format {"AccessKeyId", "SecretAccessKey", "SessionToken", "Expiration": <ISO 8601>},
+optionally wrapped in {"Credentials": ...}.
+"""
+import json
+import os
+import shlex
+import signal
+import subprocess
+import threading
+from datetime import datetime
+from typing import NamedTuple
+import data
+import helper
+
+# How often file/pasted sources are checked for changes, seconds
+POLL_INTERVAL = 5.0
+
+# Delay before retrying a failed refresh, seconds
+RETRY_INTERVAL = 30.0
+
+COMMAND_TIMEOUT = 60
+
+# Seconds Stop waits for the refresh thread, a cancelled command is killed well within it
+STOP_TIMEOUT = 2.0
+
+
+class CredentialsError(ValueError):
+    pass
+
+
+class Credentials(NamedTuple):
+    access_key: str
+    secret_key: str
+    session_token: str
+    expiration: float = None  # Unix time, None = doesn't expire
+
+    def expires_in(self) -> float or None:
+        if self.expiration is None:
+            return None
+        return self.expiration - datetime.now().timestamp()
+
+    def expiration_str(self) -> str:
+        if self.expiration is None:
+            return "never"
+        return datetime.fromtimestamp(self.expiration).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def from_settings_dict(creds: dict) -> Credentials:
+    """Credentials saved in settings.json (expiration as local "%Y-%m-%d %H:%M:%S")"""
+    access_key, secret_key, session_token = tuple(creds.values())[:3]
+    expiration = creds.get("expiration")
+    if expiration:
+        try:
+            expiration = helper.convert_datetime_str_to_object(expiration).timestamp()
+        except ValueError as e:
+            raise CredentialsError(f"Not valid expiration: {e}") from None
+    return checked(Credentials(access_key, secret_key, session_token, expiration or None))
+
+
+def checked(credentials: Credentials) -> Credentials:
+    if not all(credentials[:3]):
+        raise CredentialsError("Credentials are incomplete")
+    return credentials
+
+
+def parse_credentials_json(text: str) -> Credentials:
+    try:
+        json_obj = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise CredentialsError(f"Credentials are not valid JSON: {e}") from None
+    if not isinstance(json_obj, dict):
+        raise CredentialsError("Credentials JSON is not an object")
+    if "credentials" not in json_obj and "AccessKeyId" not in json_obj.get("Credentials", json_obj):
+        raise CredentialsError("No credentials found in JSON")
+    try:
+        credentials = _parse_credentials_obj(json_obj)
+    except (ValueError, TypeError, AttributeError) as e:
+        raise CredentialsError(f"Not valid credentials JSON: {e}") from None
+    return checked(credentials)
+
+
+def _parse_credentials_obj(json_obj: dict) -> Credentials:
+    if "credentials" in json_obj:
+        # Pasted format, expiration in epoch milliseconds
+        creds = json_obj["credentials"]
+        expiration = creds.get("expiration")
+        return Credentials(creds.get("accessKeyId"), creds.get("secretAccessKey"), creds.get("sessionToken"),
+                           int(expiration) / 1000 if expiration else None)
+
+    creds = json_obj.get("Credentials", json_obj)
+    expiration = creds.get("Expiration")
+    if expiration:
+        expiration = datetime.fromisoformat(expiration.replace("Z", "+00:00")).timestamp()
+    return Credentials(creds["AccessKeyId"], creds.get("SecretAccessKey"), creds.get("SessionToken"),
+                       expiration or None)
+
+
+class PastedProvider:
+    """Credentials pasted into the app, kept in AppSettings.credentials"""
+    watched = True
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.last_creds = None
+
+    def get(self) -> Credentials:
+        creds = self.last_creds = self.settings.credentials
+        if creds is None:
+            raise CredentialsError("Please provide credentials")
+        return from_settings_dict(creds)
+
+    def changed(self) -> bool:
+        # Pasting replaces the whole dict
+        return self.settings.credentials is not self.last_creds
+
+    def cancel(self) -> None:
+        pass
+
+
+class FileProvider:
+    """Credentials JSON file, re-read when its modification time or size changes"""
+    watched = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self.last_stat = None
+
+    def get(self) -> Credentials:
+        try:
+            stat = os.stat(self.path)
+            with open(self.path, encoding="utf-8") as file:
+                text = file.read()
+        except OSError as e:
+            raise CredentialsError(f"Credentials file can't be read: {e}") from None
+        self.last_stat = (stat.st_mtime_ns, stat.st_size)
+        return parse_credentials_json(text)
+
+    def changed(self) -> bool:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return (stat.st_mtime_ns, stat.st_size) != self.last_stat
+
+    def cancel(self) -> None:
+        pass
+
+
+def kill_process(process: subprocess.Popen) -> None:
+    try:
+        if os.name == "posix":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except OSError:
+        # Already exited
+        pass
+
+
+class CommandProvider:
+    """Local command (e.g. a credential_process helper) printing credentials JSON to stdout"""
+    watched = False
+
+    def __init__(self, command: str):
+        self.command = command
+        self.process = None
+        self.cancelled = False
+
+    def get(self) -> Credentials:
+        try:
+            # Own process group, so a kill also reaches children of a wrapper script holding the pipes
+            process = self.process = subprocess.Popen(shlex.split(self.command), stdout=subprocess.PIPE,
+                                                      stderr=subprocess.PIPE, text=True,
+                                                      start_new_session=os.name == "posix")
+        except OSError as e:
+            raise CredentialsError(f"Credentials command failed: {e}") from None
+        try:
+            stdout, stderr = process.communicate(timeout=COMMAND_TIMEOUT)
+        except subprocess.TimeoutExpired as e:
+            kill_process(process)
+            process.communicate()
+            raise CredentialsError(f"Credentials command failed: {e}") from None
+        finally:
+            self.process = None
+        if self.cancelled:
+            raise CredentialsError("Credentials command was cancelled")
+        if process.returncode:
+            error = stderr.strip().splitlines()[-1:] or [f"exit code {process.returncode}"]
+            raise CredentialsError(f"Credentials command failed: {error[0]}")
+        return parse_credentials_json(stdout)
+
+    def changed(self) -> bool:
+        return False
+
+    def cancel(self) -> None:
+        """Kills a running command, so stopping a run doesn't wait for a slow helper"""
+        self.cancelled = True
+        process = self.process
+        if process is not None:
+            kill_process(process)
+
+
+def from_settings(settings):
+    """Returns provider of settings.credential_source, raises CredentialsError if the source is not valid"""
+    kind, _, argument = settings.credential_source.partition(":")
+    kind = kind.strip().lower()
+    argument = argument.strip()
+    match kind:
+        case "pasted" | "":
+            return PastedProvider(settings)
+        case "file" if argument:
+            return FileProvider(settings.get_settings_path(os.path.expanduser(argument)))
+        case "command" if argument:
+            return CommandProvider(argument)
+    raise CredentialsError(f"Unknown credential source {settings.credential_source!r}, "
+                           f"use 'pasted', 'file:<path>' or 'command:<command line>'")
+
+
+class CredentialManager:
+    """Keeps signer credentials fresh during a run. A background thread swaps in
+    new credentials refresh_before seconds ahead of expiry (and whenever a watched
+    source changes) via Signer.update_credentials, so sending, schedule and open
+    connections are not interrupted"""
+
+    def __init__(self, provider, signer, credentials: Credentials, window, refresh_before: float):
+        self.provider = provider
+        self.signer = signer
+        self.credentials = credentials
+        self.window = window
+        self.refresh_before = refresh_before
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="credentials", daemon=True)
+        self.refreshes = 0
+
+    def start(self) -> "CredentialManager":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        self.provider.cancel()
+        # Daemon thread: if it is still stuck somewhere, it is abandoned instead of holding up Stop
+        self.thread.join(STOP_TIMEOUT)
+
+    def next_check_in(self) -> float:
+        expires_in = self.credentials.expires_in()
+        refresh_in = None if expires_in is None else max(expires_in - self.refresh_before, 0.0)
+        if self.provider.watched:
+            return POLL_INTERVAL if refresh_in is None else min(refresh_in, POLL_INTERVAL)
+        return refresh_in
+
+    def refresh_due(self) -> bool:
+        expires_in = self.credentials.expires_in()
+        return expires_in is not None and expires_in <= self.refresh_before
+
+    def run(self) -> None:
+        delay = self.next_check_in()
+        while not self.stop_event.wait(delay):
+            if self.refresh_due() or self.provider.changed():
+                delay = self.refresh()
+            else:
+                delay = self.next_check_in()
+
+    def refresh(self) -> float:
+        """Swaps in new credentials if the provider has them. Returns delay before the next check"""
+        try:
+            new_credentials = self.provider.get()
+        except CredentialsError as e:
+            if self.stop_event.is_set():
+                return RETRY_INTERVAL
+            self.window.write_to_log(f"{data.WARNING_PREFIX}Credentials refresh failed: {e} "
+                                     f"(expire at {self.credentials.expiration_str()})")
+            return RETRY_INTERVAL
+
+        if new_credentials[:3] != self.credentials[:3]:
+            self.signer.update_credentials(*new_credentials[:3])
+            self.credentials = new_credentials
+            self.window.run_credentials = new_credentials
+            self.refreshes += 1
+            self.window.write_to_log(f"Credentials refreshed, expire at {new_credentials.expiration_str()}")
+        if self.refresh_due():
+            # Source has no fresher credentials yet: don't hammer it (watched sources are cheap to re-check)
+            return POLL_INTERVAL if self.provider.watched else RETRY_INTERVAL
+        return self.next_check_in()
@@ -1,23 +1,91 @@
 from dataclasses import dataclass
+from typing import NamedTuple
 import json
 import os
 import sys
+import responses
 
 
+# Version of settings.json layout, stored in the file as "schema_version".
+# Bump it and add a step to SETTINGS_MIGRATIONS when a saved key is renamed or changes meaning
+SETTINGS_SCHEMA_VERSION = 2
+
 # Define a formatting tag to identify server warning messages when printing in app log window
 WARNING_PREFIX = '@!'
 
 
+class SendResult(NamedTuple):
+    """Outcome of one PutMetadata call. message is the sent metadata on success,
+    server/connection error message otherwise (without WARNING_PREFIX)"""
+    message: str
+    status: int = None
+    error_class: str = None
+
+    @property
+    def failed(self) -> bool:
+        return self.error_class is not None
+
+    @property
+    def category(self) -> str or None:
+        """Error category (see responses module), None on success"""
+        if not self.failed:
+            return None
+        return responses.classify(self.status, self.error_class)
+
+    @property
+    def maybe_delivered(self) -> bool:
+        """Failed without a response after the request may have reached the server"""
+        return self.failed and responses.maybe_delivered(self.status, self.error_class)
+
+
 @dataclass
 class AppSettings:
     metadata_message: str = "testMetadata"
     metadata_start_index: int = 1
-    wait: int = 3
+    wait: float = 3
     arns: dict = None
     credentials: dict = None
-    endpoint_url = "http://ivs.us-west-2.amazonaws.com/PutMetadata"
+    pool_size: int = 4
+    max_retries: int = 2
+    retry_backoff: float = 0.1
+    rate_limit_tps: float = 155.0
+    channel_rate_limit_tps: float = 5.0
+    fanout_workers: int = 8
+    engine: str = "sync"
+    max_in_flight: int = 4
+    request_timeout: float = 10.0
+    log_max_lines: int = 1000
+    send_retries: int = 5
+    backoff_base: float = 0.25
+    backoff_max: float = 10.0
+    throttle_slowdown: float = 2.0
+    recovery_speedup: float = 1.1
+    schedule: str = "constant"
+    journal_path: str = ""
+    journal_max_bytes: int = 50_000_000
+    journal_backups: int = 5
+    journal_fsync_interval: float = 1.0
+    credential_source: str = "pasted"
+    credential_refresh_before: float = 300.0
+    profile_phases: bool = False
+    profile_path: str = ""
+    soak_mode: bool = False
+    soak_window: float = 60.0
+    soak_windows: int = 60
+    soak_path: str = ""
+    endpoint_url: str = ""
+    processes: int = 1
+    pack_rate: float = 0.0
+    metrics_port: int = 0
+    metrics_host: str = "127.0.0.1"
+    control_port: int = 0
+    control_host: str = "127.0.0.1"
     headers = {"Content-Type": "application/json"}
 
+    # Run limits (0 = unlimited), set for a single run and not saved to settings.json
+    send_count = 0
+    send_duration = 0
+
     @classmethod
     def get_settings_path(cls, filename="settings.json"):
 
@@ -33,26 +101,76 @@ class AppSettings:
             script_dir = os.path.dirname(os.path.abspath(__file__))
             return os.path.join(script_dir, filename)
 
+    # settings.json content as last read or written, to skip writes when nothing changed
+    _saved_text = None
+
     @classmethod
-    def to_file(cls, filename="settings.json") -> None:
+    def to_json(cls) -> str:
+        settings_dict = {"schema_version": SETTINGS_SCHEMA_VERSION}
+        settings_dict.update((key, getattr(cls, key)) for key in cls.__annotations__)
+        return json.dumps(settings_dict, indent=4)
+
+    @classmethod
+    def to_file(cls, filename="settings.json") -> bool:
+        """Saves settings if they changed since last read/write. Returns True if the file was written.
+        Writes a temp file and renames it over settings.json, so a crash mid-write keeps the old file"""
+        settings_text = cls.to_json()
+        if settings_text == cls._saved_text:
+            return False
+
         filepath = cls.get_settings_path(filename)
-        with open(filepath, 'w') as file:
-            settings_dict = {
-                key: getattr(cls, key) for key in cls.__annotations__
-            }
-            json.dump(settings_dict, file, indent=4)
+        temp_filepath = filepath + ".tmp"
+        with open(temp_filepath, 'w') as file:
+            file.write(settings_text)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_filepath, filepath)
+
+        cls._saved_text = settings_text
+        return True
 
     @classmethod
     def from_file(cls, filename="settings.json") -> None:
         filepath = cls.get_settings_path(filename)
         try:
             with open(filepath, 'r') as file:
-                data = json.load(file)
+                settings_text = file.read()
+            data = migrate_settings(json.loads(settings_text))
 
             for key, value in data.items():
-                setattr(cls, key, value)
+                if key in cls.__annotations__:
+                    setattr(cls, key, value)
+
+            # Migrated file differs from what to_file produces, so it gets rewritten on the next save
+            cls._saved_text = settings_text
 
         except FileNotFoundError:
             print(f"File not found: {filename}")
         except json.JSONDecodeError:
             print(f"Error decoding JSON file: {filename}")
+
+
+def migrate_to_v1(settings_dict: dict) -> dict:
+    # Version 0 is settings.json written before schema_version existed; keys are the same
+    return settings_dict
+
+
+def migrate_to_v2(settings_dict: dict) -> dict:
+    # 'rate_limit_tps' used to be one bucket for all channels, defaulting to the per-channel IVS limit.
+    # It is the account limit now (next to 'channel_rate_limit_tps'), so the old default is raised to the new one
+    if settings_dict.get("rate_limit_tps") == 5.0:
+        settings_dict["rate_limit_tps"] = AppSettings.rate_limit_tps
+    return settings_dict
+
+
+# Migration step from (index + 0) to (index + 1) schema version
+SETTINGS_MIGRATIONS = [migrate_to_v1, migrate_to_v2]
+
+
+def migrate_settings(settings_dict: dict) -> dict:
+    """Upgrades settings loaded from file to SETTINGS_SCHEMA_VERSION.
+    Files from a newer app version are read as is, unknown keys are ignored"""
+    version = settings_dict.pop("schema_version", 0)
+    for migrate in SETTINGS_MIGRATIONS[version:]:
+        settings_dict = migrate(settings_dict)
+    return settings_dict
@@ -0,0 +1,187 @@
+"""Local metrics endpoint for Prometheus / OpenMetrics scrapers.
+
+With 'metrics_port' set, http://<metrics_host>:<metrics_port>/metrics serves the
+metrics of the current (or last) run in Prometheus text format 0.0.4, or in
+OpenMetrics 1.0 when the scraper asks for it in the Accept header:
+
+    smst_sends_total                          sends (responses and network errors)
+    smst_responses_total{status}              sends by HTTP status, "none" = no response
+    smst_errors_total{error_class}            failed sends by error class
+    smst_send_latency_seconds                 histogram of request latency
+    smst_schedule_lateness_seconds            histogram of lateness of send ticks
+    smst_send_rate                            average sends per second of the run
+    smst_configured_rate                      configured sends per second per channel (1 / Delay)
+    smst_running                              1 while a run is going on
+    smst_credentials_expiry_seconds           seconds until credentials expire (absent if they don't)
+
+A scrape never takes the metrics lock (SendMetrics.peek), so it can't delay sends.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import credentials
+import data
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Every N-th bucket boundary of metrics.LogHistogram is exported: 20 per decade -> 4 per decade
+BUCKET_STEP = 5
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsWriter:
+    """Builds exposition text; counter names are given without the _total suffix"""
+
+    def __init__(self, openmetrics: bool):
+        self.openmetrics = openmetrics
+        self.lines = []
+
+    def family(self, name: str, metric_type: str, help_text: str) -> None:
+        # Prometheus text names counter families with the suffix, OpenMetrics without
+        type_name = f"{name}_total" if metric_type == "counter" and not self.openmetrics else name
+        self.lines.append(f"# HELP {type_name} {help_text}")
+        self.lines.append(f"# TYPE {type_name} {metric_type}")
+
+    def sample(self, name: str, value: float, labels: dict = None) -> None:
+        if labels:
+            label_str = ",".join(f'{key}="{escape_label(str(label))}"' for key, label in labels.items())
+            name = f"{name}{{{label_str}}}"
+        self.lines.append(f"{name} {format_value(value)}")
+
+    def counter(self, name: str, help_text: str, value: float) -> None:
+        self.family(name, "counter", help_text)
+        self.sample(f"{name}_total", value)
+
+    def labelled_counter(self, name: str, help_text: str, label_name: str, counts: dict) -> None:
+        self.family(name, "counter", help_text)
+        for label, count in counts.items():
+            self.sample(f"{name}_total", count, {label_name: label})
+
+    def gauge(self, name: str, help_text: str, value: float) -> None:
+        self.family(name, "gauge", help_text)
+        self.sample(name, value)
+
+    def histogram(self, name: str, help_text: str, histogram) -> None:
+        """Cumulative buckets of a metrics.LogHistogram; count is the sum of the buckets,
+        so it matches them even if the copy raced with a send"""
+        self.family(name, "histogram", help_text)
+        last_index = len(histogram.counts) - 1
+        cumulative = 0
+        for index, bucket_count in enumerate(histogram.counts):
+            cumulative += bucket_count
+            if index == last_index:
+                # Overflow bucket
+                self.sample(f"{name}_bucket", cumulative, {"le": "+Inf"})
+            elif index % BUCKET_STEP == 0:
+                self.sample(f"{name}_bucket", cumulative, {"le": format_value(histogram.upper_bound(index))})
+        self.sample(f"{name}_count", cumulative)
+        self.sample(f"{name}_sum", histogram.total)
+
+    def text(self) -> str:
+        if self.openmetrics:
+            self.lines.append("# EOF")
+        return "\n".join(self.lines) + "\n"
+
+
+def credentials_expires_in(window, settings: data.AppSettings) -> float or None:
+    """Seconds until credentials of the current run expire, between runs those pasted in Main tab"""
+    run_credentials = window.run_credentials
+    if run_credentials is None and settings.credential_source == "pasted" and settings.credentials:
+        try:
+            run_credentials = credentials.from_settings_dict(settings.credentials)
+        except credentials.CredentialsError:
+            return None
+    return run_credentials.expires_in() if run_credentials is not None else None
+
+
+def render(window, settings: data.AppSettings, openmetrics: bool = False) -> str:
+    """Exposition text of the window's current run metrics"""
+    send_metrics = window.metrics
+    writer = MetricsWriter(openmetrics)
+    running = send_metrics is not None and not window.stop_event.is_set()
+    if send_metrics is not None:
+        snapshot = send_metrics.peek()
+        writer.counter("smst_sends", "PutMetadata sends of the run, including network errors", snapshot.sent)
+        writer.labelled_counter("smst_responses", "Sends by HTTP status, none = no response", "status",
+                                {"none" if status is None else status: count
+                                 for status, count in snapshot.statuses.items()})
+        writer.labelled_counter("smst_errors", "Failed sends by error class", "error_class", snapshot.errors)
+        writer.histogram("smst_send_latency_seconds", "PutMetadata request latency", snapshot.latency)
+        writer.histogram("smst_schedule_lateness_seconds", "Delay of send ticks behind their schedule",
+                         snapshot.lateness)
+        writer.gauge("smst_send_rate", "Average sends per second since the run started", snapshot.rate())
+    writer.gauge("smst_configured_rate", "Configured sends per second per channel (1 / Delay)",
+                 1 / settings.wait if settings.wait else 0.0)
+    writer.gauge("smst_running", "1 while a run is going on", int(running))
+    expires_in = credentials_expires_in(window, settings)
+    if expires_in is not None:
+        writer.gauge("smst_credentials_expiry_seconds", "Seconds until credentials expire", round(expires_in, 3))
+    return writer.text()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    server_version = "smst-exporter"
+
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+        body = render(self.server.window, self.server.settings, openmetrics).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        # Scrapes every few seconds would flood stderr
+        pass
+
+
+class MetricsExporter:
+    """HTTP server thread serving /metrics of a window (MainTab or cli.ConsoleWindow)"""
+
+    def __init__(self, window, settings: data.AppSettings, host: str, port: int):
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.server.daemon_threads = True
+        self.server.window = window
+        self.server.settings = settings
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics-exporter", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self) -> "MetricsExporter":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+def from_settings(window, settings: data.AppSettings) -> MetricsExporter or None:
+    """Returns a started exporter, None if 'metrics_port' is 0 or the port can't be bound"""
+    if not settings.metrics_port:
+        return None
+    try:
+        exporter = MetricsExporter(window, settings, settings.metrics_host, settings.metrics_port).start()
+    except OSError as e:
+        window.write_to_log(f"{data.WARNING_PREFIX}Metrics endpoint can't be opened on "
+                            f"{settings.metrics_host}:{settings.metrics_port}: {e}")
+        return None
+    window.write_to_log(f"Metrics endpoint: {exporter.url}")
+    return exporter
@@ -0,0 +1,135 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import data
+import profiling
+import ratecontrol
+import ratelimit
+import scheduler
+
+
+@dataclass
+class ChannelState:
+    """Own index, schedule, retry/rate and error state of a single channel stream"""
+    name: str
+    arn: str
+    index: int
+    schedule: scheduler.Scheduler
+    rate: ratecontrol.RateController
+    log_prefix: str = ""
+    log_sends: bool = True
+    sent: int = 0
+    errors: int = 0
+    last_error: str = ""
+    active: bool = True
+
+    def log_line(self, result: data.SendResult, lateness_note: str = None) -> str or None:
+        """Log line of a send: metadata (+ lateness) or error (+ retry info).
+        None for successful sends when they aren't logged (soak mode)"""
+        if result.failed:
+            return f"{data.WARNING_PREFIX}{self.log_prefix}{result.message}{self.rate.note}"
+        if not self.log_sends:
+            return None
+        if lateness_note is None:
+            lateness_note = self.schedule.lateness_note()
+        return f"{self.log_prefix}{result.message}{lateness_note}{self.rate.note}"
+
+    def record(self, result: data.SendResult) -> None:
+        """Applies final result of the current index"""
+        if result.failed:
+            self.errors += 1
+            self.last_error = result.message
+            self.active = False
+        else:
+            self.sent += 1
+            self.index += 1
+
+    def summary(self) -> str:
+        return f"{self.log_prefix}sent: {self.sent}, errors: {self.errors}, {self.rate.summary()}"
+
+
+def run(window, settings: data.AppSettings, channels: dict, send) -> None:
+    """Sends the same sequential stream to all given channels at once.
+    send(arn, metadata_index, metadata) performs one blocking PutMetadata call and returns
+    data.SendResult; it runs on a bounded worker pool while scheduling of
+    all channels happens on a single asyncio event loop"""
+    states = new_channel_states(window, settings, channels)
+    asyncio.run(_run_channels(window, settings, states, send))
+
+    # Summary of each channel's stream
+    for state in states:
+        window.write_to_log(state.summary())
+
+
+def new_channel_state(window, settings: data.AppSettings, name: str, arn: str, prefixed: bool = False) -> ChannelState:
+    return ChannelState(name, arn, settings.metadata_start_index,
+                        scheduler.from_settings(settings, window),
+                        ratecontrol.from_settings(settings),
+                        f"[{name}] " if prefixed else "",
+                        # Soak mode counts successful sends in time windows instead of logging each
+                        not settings.soak_mode)
+
+
+def new_channel_states(window, settings: data.AppSettings, channels: dict) -> list:
+    prefixed = len(channels) > 1
+    return [new_channel_state(window, settings, name, arn, prefixed) for name, arn in channels.items()]
+
+
+def worker_count(settings: data.AppSettings, channels_count: int) -> int:
+    """Threads making the blocking sends of a run, one per channel up to 'fanout_workers'"""
+    return max(1, min(channels_count, settings.fanout_workers))
+
+
+async def _run_channels(window, settings: data.AppSettings, states: list, send) -> None:
+    # Each channel within its own PutMetadata limit, all of them together within the account one
+    buckets = ratelimit.from_settings(settings, [state.arn for state in states])
+    workers = worker_count(settings, len(states))
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fanout") as pool:
+        channel_tasks = [asyncio.create_task(_run_channel(window, state, buckets[state.arn], pool, send))
+                         for state in states]
+        await run_until_stopped(window.stop_event, channel_tasks)
+
+
+async def run_until_stopped(stop_event, channel_tasks: list) -> None:
+    """Runs channel tasks until Stop is pressed or every channel stopped on its own error"""
+    # Stop is signalled by a threading.Event - wait for it off the loop
+    stop_task = asyncio.create_task(asyncio.to_thread(stop_event.wait))
+
+    channels_done = asyncio.gather(*channel_tasks, return_exceptions=True)
+    await asyncio.wait([stop_task, channels_done], return_when=asyncio.FIRST_COMPLETED)
+
+    for task in channel_tasks:
+        task.cancel()
+    await channels_done
+
+    # Release the waiting thread if all channels finished on their own
+    if not stop_task.done():
+        stop_event.set()
+        await stop_task
+
+
+async def _run_channel(window, state: ChannelState, bucket: ratelimit.TokenBucket,
+                       pool: ThreadPoolExecutor, send) -> None:
+    loop = asyncio.get_running_loop()
+
+    while state.active and await state.schedule.async_wait_next():
+        while True:
+            # Wait for a token of the channel and account rate limits (retries take tokens too)
+            await asyncio.sleep(bucket.reserve())
+
+            result = await loop.run_in_executor(pool, send, state.arn, state.index, state.schedule.metadata)
+            retry_delay = state.rate.handle(result, state.schedule, state.index)
+            with profiling.phase("log"):
+                log_line = state.log_line(result)
+                if log_line is not None:
+                    window.write_to_log(log_line)
+
+            if retry_delay is None:
+                break
+            await asyncio.sleep(retry_delay)
+
+        # Final error stops only this channel, others keep sending
+        state.record(result)
+        if result.failed:
+            window.metrics.record_failure()
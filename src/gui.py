@@ -1,9 +1,36 @@
+import time
+
+# Taken before any other import, so startup timing mode can report import time
+STARTUP_TIME = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk
+from tkinter import filedialog
+import os
+import queue
+import sys
 import threading
-import api_calls
+from collections import deque
 import data
 import helper
+import metrics
+import profiling
+
+
+# Interval (ms) at which Tk main loop moves queued log records into the log window
+# and runs calls queued by other threads
+LOG_DRAIN_INTERVAL_MS = 50
+
+# Settings edits are saved to settings.json once no further edit came within this delay (ms)
+SETTINGS_SAVE_DELAY_MS = 1000
+
+# Choices of the delay (seconds between messages) spinbox
+DELAY_CHOICES = (0.1, 0.2, 0.25, 0.5, 1, 1.5, 2, 3, 4, 5, 6, 7, 8, 9, 10)
+
+# Startup timing mode: reports import and first-window timings to stdout and the log window.
+# Enabled with "--startup-timing" argument or SMST_STARTUP_TIMING=1 environment variable
+STARTUP_TIMING = "--startup-timing" in sys.argv or os.environ.get("SMST_STARTUP_TIMING") == "1"
+IMPORTS_DONE_TIME = time.perf_counter()
 
 
 class TButton(ttk.Button):
@@ -25,11 +52,12 @@ class App(tk.Tk):
     def __init__(self):
         super().__init__()
         self.title('SMST')
-        self.geometry('650x550')
+        self.geometry('650x580')
         self.resizable(width=False, height=False)
 
         # Recall app settings on opening
         data.AppSettings.from_file()
+        self.__settings_save_job = None
 
         # Add app title
         title_label = ttk.Label(master=self,
@@ -72,15 +100,41 @@ class App(tk.Tk):
             # Lock Main tab
             self.notebook.tab(0, state='disabled')
 
+        # Optional local /metrics endpoint for Prometheus scrapers (http.server is imported only if enabled)
+        self.metrics_exporter = None
+        if data.AppSettings.metrics_port:
+            import exporter
+            self.metrics_exporter = exporter.from_settings(self.main_tab, data.AppSettings)
+
+        # Optional local control API for test automation, its commands run on Tk main loop
+        self.control_server = None
+        if data.AppSettings.control_port:
+            import control
+            self.control_server = control.from_settings(self.main_tab, data.AppSettings,
+                                                        control.queued_caller(self.main_tab.ui_calls))
+
         # Apply specific actions when switching tabs
         self.notebook.bind("<<NotebookTabChanged>>", self.actions_on_switching_tabs)
 
         # On app closing
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
 
+        if STARTUP_TIMING:
+            window_init_time = time.perf_counter()
+            # Idle callbacks run once the first window has been drawn
+            self.after(0, lambda: self.after_idle(self.report_startup_timing, window_init_time))
+
         # Run
         self.mainloop()
 
+    def report_startup_timing(self, window_init_time: float) -> None:
+        first_window_time = time.perf_counter()
+        report = (f"Startup timing: imports {(IMPORTS_DONE_TIME - STARTUP_TIME) * 1000:.1f} ms, "
+                  f"window init {(window_init_time - IMPORTS_DONE_TIME) * 1000:.1f} ms, "
+                  f"first window {(first_window_time - STARTUP_TIME) * 1000:.1f} ms")
+        print(report, flush=True)
+        self.main_tab.write_to_log(report)
+
     def actions_on_switching_tabs(self, event) -> None:
         selected_tab = event.widget.select()
         tab_text = event.widget.tab(selected_tab, "text")
@@ -112,11 +166,34 @@ class App(tk.Tk):
         self.main_tab.update_credentials_in_main_tab(saved_credentials)
         set_focus_to_widget(self.main_tab.start_button)
 
+    def save_settings_later(self) -> None:
+        # Debounce: rapid edits (e.g. typing in an entry) are coalesced into one write
+        if self.__settings_save_job is not None:
+            self.after_cancel(self.__settings_save_job)
+        self.__settings_save_job = self.after(SETTINGS_SAVE_DELAY_MS, self.save_settings)
+
+    def save_settings(self) -> None:
+        self.__settings_save_job = None
+        data.AppSettings.to_file()
+
     def add_tab(self, tab) -> None:
         self.notebook.add(tab, text=tab.name)
 
     def on_closing(self) -> None:
-        data.AppSettings.to_file()
+        if self.control_server is not None:
+            self.control_server.stop()
+        self.main_tab.stop_action()
+        self.main_tab.cancel_log_drain()
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.stop()
+
+        # Network modules are imported on the first Start only
+        api_calls = sys.modules.get("api_calls")
+        if api_calls is not None:
+            api_calls.close_transport()
+        if self.__settings_save_job is not None:
+            self.after_cancel(self.__settings_save_job)
+        self.save_settings()
         self.destroy()
 
 
@@ -126,7 +203,9 @@ class MainTab(ttk.Frame):
         self.__master = master
         self.name = 'Main'
         self.running_thread = None
-        self.stop_flag = False
+        self.stop_event = threading.Event()
+        self.metrics = None
+        self.run_credentials = None
         self.thread_lock = threading.Lock()
 
         # arn dropdown
@@ -139,9 +218,21 @@ class MainTab(ttk.Frame):
         self.selected_arn = tk.StringVar()
 
         self.arn_dropdown = tk.OptionMenu(arn_frame, self.selected_arn, None)
-        self.arn_dropdown.config(width='45')
+        self.arn_dropdown.config(width='35')
         self.arn_dropdown.pack(side='left')
 
+        # Fan-out mode: send to all saved channels at once
+        self.all_channels = tk.BooleanVar()
+        self.all_channels_checkbox = ttk.Checkbutton(master=arn_frame,
+                                                     text='All channels',
+                                                     variable=self.all_channels)
+        self.all_channels_checkbox.pack(side='left', padx='5')
+
+        # Plain copies of the selection, safe to read from any thread (control API status)
+        self.__copy_channel_selection()
+        self.selected_arn.trace_add('write', self.__copy_channel_selection)
+        self.all_channels.trace_add('write', self.__copy_channel_selection)
+
         # json string input field
         input_frame = ttk.Frame(master=self)
         input_frame.pack(fill="x", padx='10', pady='10')
@@ -186,6 +277,32 @@ class MainTab(ttk.Frame):
         self.__log = tk.Text(master=log_frame, height=10, state='disabled')
         self.__log.pack()
 
+        # Live send metrics of current/last run
+        metrics_frame = ttk.Frame(master=log_frame)
+        metrics_frame.pack(fill="x")
+
+        self.metrics_label = ttk.Label(master=metrics_frame)
+        self.metrics_label.pack(side='left')
+        self.__shown_metrics_sent = None
+
+        self.export_metrics_button = TButton(master=metrics_frame,
+                                             text='Export metrics',
+                                             state='disabled',
+                                             command=self.export_metrics)
+        self.export_metrics_button.pack(side='right')
+
+        # Create formatting tag for warnings
+        self.__log.tag_config('warning', foreground="red")
+
+        # Log records queued by any thread, drained in batches by Tk main loop.
+        # Bounded, so a flood of records drops the oldest ones instead of growing memory.
+        self.__log_max_lines = data.AppSettings.log_max_lines
+        self.__log_records = deque(maxlen=self.__log_max_lines)
+        self.__widget_to_focus_after_run = None
+        # Functions queued by other threads (control API commands), run by Tk main loop
+        self.ui_calls = queue.Queue()
+        self.__drain_job = self.after(LOG_DRAIN_INTERVAL_MS, self.__drain_log)
+
     def submit_action(self) -> None:
         self.__process_json_input(self.json_entry.get())
 
@@ -193,28 +310,53 @@ class MainTab(ttk.Frame):
         # updating credentials in the main tab with empty string
         self.update_credentials_in_main_tab()
         data.AppSettings.credentials = None
+        self.__master.save_settings_later()
         set_focus_to_widget(self.json_entry)
 
-    def start_action(self) -> None:
+    def start_action(self, send_count: int = 0, send_duration: float = 0) -> None:
+        # Deferred until the first Start: requests and signing modules make up most of the startup time
+        import api_calls
+
         settings = data.AppSettings
         with self.thread_lock:
             if self.running_thread is None or not self.running_thread.is_alive():
-                self.stop_flag = False
+                # Run limits come only from the control API, Start button runs until stopped
+                settings.send_count = send_count
+                settings.send_duration = send_duration
+                # Event of this run only: it's replaced once the thread of the previous run has exited,
+                # so the engine reads the one it was started with
+                self.stop_event = threading.Event()
+                self.metrics = metrics.SendMetrics()
                 self.disable_user_input_in_widgets(True)
                 self.running_thread = threading.Thread(target=api_calls.main, args=(self, settings))
                 self.running_thread.start()
                 self.stop_button.focus_set()
 
     def stop_action(self, widget_to_focus=None) -> None:
+        # Send thread only signals stop, widgets are restored later by Tk main loop
+        if threading.current_thread() is not threading.main_thread():
+            self.stop_event.set()
+            self.__widget_to_focus_after_run = widget_to_focus
+            return
+
         with self.thread_lock:
             if self.running_thread and self.running_thread.is_alive():
-                self.stop_flag = True
-                self.running_thread = None
+                # Start stays disabled until the thread is done with its last request,
+                # Tk main loop restores widgets once it has exited
+                self.stop_event.set()
+                if widget_to_focus is not None:
+                    self.__widget_to_focus_after_run = widget_to_focus
+                return
             self.disable_user_input_in_widgets(False)
             if widget_to_focus is None:
                 widget_to_focus = self.start_button
             set_focus_to_widget(widget_to_focus)
 
+    def set_delay(self, delay: float) -> None:
+        """Changes Delay as if it was picked in Settings tab, a running send loop follows it"""
+        self.__master.settings_tab.entered_delay.set(delay)
+        self.__master.settings_tab.update_delay_in_settings()
+
     def update_arn_dropdown_list(self) -> None:
         # Clear the existing menu
         menu = self.arn_dropdown["menu"]
@@ -247,20 +389,79 @@ class MainTab(ttk.Frame):
         self.credentials_info['state'] = 'disabled'
 
     def write_to_log(self, msg) -> None:
-        self.__log['state'] = 'normal'
-        tag = ''
+        """Thread-safe: only queues the record, Tk main loop inserts it into log window"""
+        self.__log_records.append((helper.now_datetime(), msg))
+
+    def __copy_channel_selection(self, *args) -> None:
+        self.selected_channel_name = self.selected_arn.get()
+        self.all_channels_selected = bool(self.all_channels.get())
+
+    def __drain_log(self) -> None:
+        self.__run_ui_calls()
+        if self.__log_records:
+            with profiling.phase("gui"):
+                self.__insert_log_records()
+
+        self.__update_metrics_label()
+        self.__restore_widgets_after_finished_run()
+        self.__drain_job = self.after(LOG_DRAIN_INTERVAL_MS, self.__drain_log)
+
+    def __run_ui_calls(self) -> None:
+        while True:
+            try:
+                function = self.ui_calls.get_nowait()
+            except queue.Empty:
+                return
+            function()
 
-        # Create formatting tag for warnings
-        self.__log.tag_config('warning', foreground="red")
+    def __insert_log_records(self) -> None:
+        insert_args = []
+        for _ in range(len(self.__log_records)):
+            timestamp, msg = self.__log_records.popleft()
+            tag = ''
+
+            # Check if message has a warning prefix
+            if msg.startswith(data.WARNING_PREFIX):
+                msg = msg[len(data.WARNING_PREFIX):]
+                tag = 'warning'
+            insert_args += [f'{timestamp} {msg}\n', tag]
 
-        # Check if message has a warning prefix
-        if msg.startswith(data.WARNING_PREFIX):
-            msg = msg[len(data.WARNING_PREFIX):]
-            tag = 'warning'
-        self.__log.insert('end', f'{helper.now_datetime()} {msg}\n', tag)
+        # One insert, trim and scroll per batch
+        self.__log['state'] = 'normal'
+        self.__log.insert('end', *insert_args)
+        lines_count = int(self.__log.index('end-1c').split('.')[0]) - 1
+        if lines_count > self.__log_max_lines:
+            self.__log.delete('1.0', f'{lines_count - self.__log_max_lines + 1}.0')
         self.__log.yview_scroll(10, "pages")
         self.__log['state'] = 'disabled'
 
+    def __restore_widgets_after_finished_run(self) -> None:
+        with self.thread_lock:
+            finished = self.running_thread is not None and not self.running_thread.is_alive()
+            if finished:
+                self.running_thread = None
+        if finished:
+            self.stop_action(self.__widget_to_focus_after_run)
+            self.__widget_to_focus_after_run = None
+
+    def __update_metrics_label(self) -> None:
+        # Refresh only when new sends were recorded
+        if self.metrics is not None and self.metrics.sent != self.__shown_metrics_sent:
+            self.__shown_metrics_sent = self.metrics.sent
+            self.metrics_label.config(text=self.metrics.summary())
+
+    def export_metrics(self) -> None:
+        if self.metrics is None:
+            return
+        path = filedialog.asksaveasfilename(defaultextension='.json',
+                                            filetypes=[('JSON', '*.json'), ('CSV', '*.csv')])
+        if path:
+            self.metrics.export(path)
+            self.write_to_log(f"Metrics exported to {path}")
+
+    def cancel_log_drain(self) -> None:
+        self.after_cancel(self.__drain_job)
+
     def json_entry_return_key_event(self, event) -> None:
         self.submit_action()
 
@@ -273,9 +474,9 @@ class MainTab(ttk.Frame):
         self.json_entry.delete(0, 'end')
         set_focus_to_widget(self.start_button)
 
-    @staticmethod
-    def update_credentials_in_settings(creds) -> None:
+    def update_credentials_in_settings(self, creds) -> None:
         data.AppSettings.credentials = creds
+        self.__master.save_settings_later()
 
     def disable_user_input_in_widgets(self, b) -> None:
         if b:
@@ -285,10 +486,11 @@ class MainTab(ttk.Frame):
             state = 'normal'
             self.__master.settings_tab.delay_entry['state'] = 'readonly'
         self.arn_dropdown['state'] = state
-        self.json_entry['state'] = state
+        self.all_channels_checkbox['state'] = state
+        # Credentials JSON stays editable: credentials pasted during a run are swapped into it
         self.clear_credentials_button['state'] = state
-        self.submit_button['state'] = state
         self.start_button['state'] = state
+        self.export_metrics_button['state'] = state
         self.__master.settings_tab.message_entry['state'] = state
         self.__master.settings_tab.index_entry['state'] = state
         self.__master.settings_tab.ch_name_entry['state'] = state
@@ -335,11 +537,11 @@ class SettingsTab(ttk.Frame):
                               if data.AppSettings.metadata_start_index == 0 else None)
 
         # Delay (wait) entry
-        self.entered_delay = tk.IntVar()
+        self.entered_delay = tk.StringVar()
         self.entered_delay.set(data.AppSettings.wait)
-        self.delay_entry = tk.Spinbox(master=index_and_delay_frame, from_=2, to=10,
+        self.delay_entry = tk.Spinbox(master=index_and_delay_frame, values=DELAY_CHOICES,
                                       textvariable=self.entered_delay,
-                                      width=2, state='readonly',
+                                      width=4, state='readonly',
                                       command=self.update_delay_in_settings)
         self.delay_entry.pack(side='right', padx=10)
         delay_entry_label = ttk.Label(master=index_and_delay_frame,
@@ -408,10 +610,12 @@ class SettingsTab(ttk.Frame):
     def update_message_in_settings(self, event) -> None:
         new_message = self.message.get()
         data.AppSettings.metadata_message = new_message
+        self.__master.save_settings_later()
 
     def update_delay_in_settings(self) -> None:
-        new_delay_value = int(self.entered_delay.get())
-        data.AppSettings.wait = new_delay_value
+        new_delay_value = float(self.entered_delay.get())
+        data.AppSettings.wait = int(new_delay_value) if new_delay_value.is_integer() else new_delay_value
+        self.__master.save_settings_later()
 
     def update_index_in_settings(self, event) -> None:
         entry_content = self.entered_index.get()
@@ -423,6 +627,7 @@ class SettingsTab(ttk.Frame):
         except ValueError:
             entry_content = 0
         data.AppSettings.metadata_start_index = entry_content
+        self.__master.save_settings_later()
 
     def insert_data_to_treeview(self, arns) -> None:
         if arns.items():
@@ -515,7 +720,12 @@ class SettingsTab(ttk.Frame):
             name, arn = values
             all_arns[name] = arn
         data.AppSettings.arns = all_arns
+        self.__master.save_settings_later()
 
 
 if __name__ == "__main__":
+    # Worker processes of multi-process runs start the bundled executable again
+    import multiprocessing
+    multiprocessing.freeze_support()
+
     app = App()
@@ -1,8 +1,13 @@
+from __future__ import annotations
 import json
 import re
+import time
 from datetime import datetime
+from typing import TYPE_CHECKING
 import data
-from gui import MainTab
+
+if TYPE_CHECKING:
+    from gui import MainTab
 
 
 def is_valid_json(json_string: str) -> bool:
@@ -43,14 +48,24 @@ def credentials_to_str_for_display(creds: dict) -> str:
         return ""
 
 
+# (second, "%d/%m/%Y %H:%M:%S" string of that second), single attribute so it's replaced atomically
+_timestamp_cache = (None, "")
+
+
 def now_datetime(obj: bool = False) -> datetime or str:
     """Returns now datetime in datetime object (obj=True) or str type"""
-    now = datetime.now()
-    dt_string = now.strftime("%d/%m/%Y %H:%M:%S.%f")[:-3]
     if obj:
-        return now
-    else:
-        return dt_string
+        return datetime.now()
+
+    # Called for every log line: the date/time part is formatted once per second, only milliseconds per call
+    global _timestamp_cache
+    now = time.time()
+    second = int(now)
+    cached_second, second_string = _timestamp_cache
+    if cached_second != second:
+        second_string = time.strftime("%d/%m/%Y %H:%M:%S", time.localtime(second))
+        _timestamp_cache = (second, second_string)
+    return f"{second_string}.{int((now - second) * 1000):03d}"
 
 
 def remove_from_newline(text: str) -> str:
@@ -75,12 +90,6 @@ def credentials_expired(datetime_to_check: datetime) -> bool:
         return False
 
 
-def time_correction(request_time: datetime, response_time: datetime) -> float:
-    """The function returns the delta of two datetime objects."""
-    datetime_delta = response_time - request_time
-    return round(float(datetime_delta.total_seconds()), 3)
-
-
 def existing_arn(name, arn) -> bool:
     res = False
     if data.AppSettings.arns:
@@ -0,0 +1,125 @@
+import json
+import os
+import threading
+
+
+class SendJournal:
+    """Append-only JSON Lines journal with one record per PutMetadata request.
+    Writes go through a userspace buffer, a background thread flushes and fsyncs
+    the file at most every fsync_interval seconds (record() never waits for the disk).
+    The file is rotated to <path>.1 ... <path>.<backups> when it grows over
+    max_bytes (0 = never rotate)"""
+
+    def __init__(self, path: str, max_bytes: int = 50_000_000, backups: int = 5, fsync_interval: float = 1.0,
+                 buffer_size: int = 64 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.fsync_interval = fsync_interval
+        self.buffer_size = buffer_size
+        self.lock = threading.Lock()
+        # Size is counted, not asked with tell(): tell() on a text file flushes its buffer on every record
+        self.size = 0
+        self.file = self.open()
+        self.records = 0
+
+        # Duplicated descriptors of rotated files, fsynced by the sync thread
+        self.rotated = []
+        self.written = threading.Event()
+        self.closing = threading.Event()
+        self.sync_thread = threading.Thread(target=self.sync_loop, name="journal-sync", daemon=True)
+        self.sync_thread.start()
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        file = open(self.path, "a", encoding="utf-8", buffering=self.buffer_size)
+        self.size = os.path.getsize(self.path)
+        return file
+
+    def record(self, channel: str, arn: str, metadata_index: int, metadata: str, request_time: float,
+               request_wall_time: float, response_time: float, result) -> None:
+        """Adds record of one request; times are time.monotonic / time.time, result is data.SendResult"""
+        line = json.dumps({
+            "index": metadata_index,
+            "channel": channel,
+            "arn": arn,
+            "metadata": metadata,
+            "request_mono": round(request_time, 6),
+            "request_wall": round(request_wall_time, 6),
+            "response_mono": round(response_time, 6),
+            "status": result.status,
+            "error_class": result.error_class,
+            "category": result.category,
+            "maybe_delivered": result.maybe_delivered,
+            "error": result.message if result.failed else None,
+        }, separators=(",", ":"), ensure_ascii=False)
+
+        line += "\n"
+        line_bytes = len(line.encode("utf-8")) if self.max_bytes else 0
+
+        with self.lock:
+            self.file.write(line)
+            self.records += 1
+            self.size += line_bytes
+
+            if self.max_bytes and self.size >= self.max_bytes:
+                self.rotate()
+        if not self.written.is_set():
+            self.written.set()
+
+    def sync_loop(self) -> None:
+        # Waits for records, lets them gather for fsync_interval, then syncs them in one go
+        while not self.closing.is_set():
+            self.written.wait()
+            if self.closing.wait(self.fsync_interval):
+                break
+            self.written.clear()
+            self.sync()
+
+    def sync(self) -> None:
+        """Flushes the buffer under the lock, the slow fsync runs on duplicated descriptors without it"""
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.flush()
+            descriptors = self.rotated + [os.dup(self.file.fileno())]
+            self.rotated = []
+        for descriptor in descriptors:
+            try:
+                os.fsync(descriptor)
+            finally:
+                os.close(descriptor)
+
+    def rotate(self) -> None:
+        """Called with the lock held; the closed file is fsynced later by the sync thread"""
+        self.file.flush()
+        self.rotated.append(os.dup(self.file.fileno()))
+        self.file.close()
+        if self.backups:
+            for number in range(self.backups - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{number}"):
+                    os.replace(f"{self.path}.{number}", f"{self.path}.{number + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.file = self.open()
+
+    def close(self) -> None:
+        self.closing.set()
+        self.written.set()
+        self.sync_thread.join()
+        self.sync()
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+
+def from_settings(settings) -> SendJournal or None:
+    """Returns journal of a run, None if journal is turned off (empty journal_path)"""
+    if not settings.journal_path:
+        return None
+    # Relative paths are next to settings.json, so the bundled app doesn't write into its working directory
+    path = settings.get_settings_path(os.path.expanduser(settings.journal_path))
+    return SendJournal(path, settings.journal_max_bytes, settings.journal_backups, settings.journal_fsync_interval)
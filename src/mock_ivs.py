@@ -0,0 +1,196 @@
+"""Local stand-in for the IVS PutMetadata API.
+
+Implements PutMetadata semantics (204 on success, JSON error bodies with
+x-amzn-ErrorType) plus fault injection, so the send path can be tested and
+benchmarked offline:
+
+    python mock_ivs.py --port 8080 --latency 50 --tps 5 --drop-rate 0.01
+    python cli.py --endpoint-url http://127.0.0.1:8080/PutMetadata
+
+GET /_stats returns receive times (time.monotonic) of accepted cues, POST /_reset clears them.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import payload
+import ratelimit
+
+
+@dataclass
+class MockConfig:
+    latency: float = 0.0  # seconds added to every response
+    jitter: float = 0.0  # random extra latency, seconds
+    tps: float = 0.0  # per-channel PutMetadata limit (0 = unlimited)
+    drop_rate: float = 0.0  # fraction of requests answered by closing the connection
+    error_rate: float = 0.0  # fraction of requests answered with 500
+    offline_channels: set = field(default_factory=set)  # ARNs answered with ChannelNotBroadcasting
+
+
+class MockIVSServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple, config: MockConfig):
+        super().__init__(address, MockIVSHandler)
+        self.config = config
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.received = []  # (monotonic time, channelArn, metadata)
+        self.responses = {}  # status -> count
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/PutMetadata"
+
+    def start(self) -> "MockIVSServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def allow(self, arn: str) -> bool:
+        if not self.config.tps:
+            return True
+        with self.lock:
+            bucket = self.buckets.get(arn)
+            if bucket is None:
+                bucket = self.buckets[arn] = ratelimit.TokenBucket(self.config.tps, self.config.tps)
+        return bucket.try_acquire()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"received": list(self.received), "responses": dict(self.responses)}
+
+    def reset(self) -> None:
+        with self.lock:
+            self.received.clear()
+            self.responses.clear()
+            self.buckets.clear()
+
+
+class MockIVSHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: MockIVSServer
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        if self.path == "/_stats":
+            self.send_json(200, self.server.stats())
+        else:
+            self.send_error_body(404, "ResourceNotFoundException", "Not found")
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        config = self.server.config
+
+        if self.path == "/_reset":
+            self.server.reset()
+            self.send_json(200, {})
+            return
+
+        delay = config.latency + random.uniform(0, config.jitter)
+        if delay:
+            time.sleep(delay)
+
+        if random.random() < config.drop_rate:
+            # Connection drop: no response at all
+            self.close_connection = True
+            return
+
+        if self.path != "/PutMetadata":
+            self.send_error_body(404, "ResourceNotFoundException", f"Unknown operation {self.path}")
+            return
+        if "Authorization" not in self.headers:
+            self.send_error_body(403, "AccessDeniedException", "Missing Authentication Token")
+            return
+
+        try:
+            request = json.loads(body)
+            arn = request["channelArn"]
+            metadata = request["metadata"]
+        except (ValueError, KeyError, TypeError):
+            self.send_error_body(400, "ValidationException",
+                                 "1 validation error detected:\nRequest body is not valid PutMetadata input")
+            return
+
+        if not metadata or len(metadata.encode("utf-8")) > payload.METADATA_MAX_BYTES:
+            self.send_error_body(400, "ValidationException",
+                                 "1 validation error detected:\n"
+                                 f"Value at 'metadata' failed to satisfy constraint: "
+                                 f"Member must have length between 1 and {payload.METADATA_MAX_BYTES}")
+            return
+        if random.random() < config.error_rate:
+            self.send_error_body(500, "InternalServerException", "Unexpected error during processing\nPlease retry")
+            return
+        if not self.server.allow(arn):
+            self.send_error_body(429, "ThrottlingException",
+                                 "Request was denied due to request throttling.\nRate exceeded")
+            return
+        if arn in config.offline_channels:
+            self.send_error_body(404, "ChannelNotBroadcasting",
+                                 "Channel is not currently broadcasting.\nStart a stream and retry")
+            return
+
+        with self.server.lock:
+            self.server.received.append((time.monotonic(), arn, metadata))
+        self.count_response(204)
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def count_response(self, status: int) -> None:
+        with self.server.lock:
+            self.server.responses[status] = self.server.responses.get(status, 0) + 1
+
+    def send_json(self, status: int, obj: dict, extra_headers: dict = None) -> None:
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_body(self, status: int, error_type: str, message: str) -> None:
+        self.count_response(status)
+        self.send_json(status, {"message": message}, {"x-amzn-ErrorType": error_type})
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Local IVS PutMetadata stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0, help="response latency, ms")
+    parser.add_argument("--jitter", type=float, default=0, help="random extra latency, ms")
+    parser.add_argument("--tps", type=float, default=0, help="per-channel rate limit (0 = unlimited)")
+    parser.add_argument("--drop-rate", type=float, default=0, help="fraction of dropped connections")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of 500 responses")
+    parser.add_argument("--offline", action="append", default=[], help="ARN of channel that is not broadcasting")
+    return parser.parse_args(argv)
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(latency=args.latency / 1000, jitter=args.jitter / 1000, tps=args.tps,
+                      drop_rate=args.drop_rate, error_rate=args.error_rate,
+                      offline_channels=set(args.offline))
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    server = MockIVSServer((args.host, args.port), config_from_args(args))
+    print(f"Mock PutMetadata listening on {server.url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
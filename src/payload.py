@@ -0,0 +1,235 @@
+import json
+import random
+import re
+import time
+
+# IVS limit for the metadata payload
+METADATA_MAX_BYTES = 1024
+
+# Template placeholders: name -> (printf conversion, widest rendered value used for size validation).
+# Every value is an integer, so rendered placeholders never need JSON escaping
+PLACEHOLDERS = {
+    "index": ("%d", 12),  # metadata index
+    "mono_ms": ("%d", 13),  # time.monotonic of the send, ms
+    "wall_ms": ("%d", 13),  # wall clock (Unix epoch) of the send, ms
+    "rand": ("%08x", 8),  # 32 random bits, hex
+}
+
+# Substituted once per channel when the template is compiled
+CHANNEL_PLACEHOLDER = "channel"
+
+PLACEHOLDER_PATTERN = re.compile(r"\$\{(\w+)\}|\$\$")
+
+# Packed payload (settings "pack_rate" > 0), several logical events in one metadata string:
+#   {"pack":1,"i":<index of first event>,"t":<wall ms of first event>,"dt":[<ms after first event>,...],"e":[<event>,...]}
+# Event k has index i + k, wall clock time t + dt[k] and metadata e[k] (the rendered message template)
+PACK_VERSION = 1
+
+# Widest packed payload around its events (12 digit index, 13 digit time) and widest overhead of one event
+PACK_OVERHEAD_BYTES = len('{"pack":1,"i":,"t":,"dt":[],"e":[]}') + 12 + 13
+PACK_EVENT_OVERHEAD_BYTES = len(',,""') + 10
+
+
+def wall_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+def mono_ms() -> int:
+    return time.monotonic_ns() // 1_000_000
+
+
+def rand() -> int:
+    return random.getrandbits(32)
+
+
+class TemplateError(ValueError):
+    pass
+
+
+def is_template(message: str) -> bool:
+    """Messages with ${...} placeholders are templates, others get "_<index>" appended"""
+    return "${" in message
+
+
+def parse_template(message: str, channel_name: str = "") -> list:
+    """Splits template into literal strings and placeholder names (tuples of one name).
+    Without placeholders the message is the legacy "<message>_<index>" form"""
+    if not is_template(message):
+        return [f"{message}_", ("index",)]
+
+    parts = []
+    literal = ""
+    position = 0
+    for match in PLACEHOLDER_PATTERN.finditer(message):
+        literal += message[position:match.start()]
+        position = match.end()
+        name = match.group(1)
+        if name is None:
+            # "$$" is an escaped dollar sign
+            literal += "$"
+        elif name == CHANNEL_PLACEHOLDER:
+            literal += channel_name
+        elif name in PLACEHOLDERS:
+            parts += [literal, (name,)]
+            literal = ""
+        else:
+            available = ", ".join("${%s}" % key for key in (*PLACEHOLDERS, CHANNEL_PLACEHOLDER))
+            raise TemplateError(f"Unknown template placeholder: ${{{name}}}. Available: {available}")
+    parts.append(literal + message[position:])
+    return parts
+
+
+def validate_template(message: str, channel_names=("",), packed: bool = False) -> None:
+    """Raises TemplateError if rendered metadata can exceed IVS limit or a JSON template renders invalid JSON.
+    With packed=True at least one event has to fit into a packed payload"""
+    for channel_name in channel_names:
+        parts = parse_template(message, channel_name)
+        if packed:
+            # Events are JSON strings inside the packed payload, literals count escaped
+            max_bytes = sum(len(json.dumps(part, ensure_ascii=False).encode("utf-8")) - 2 if isinstance(part, str)
+                            else PLACEHOLDERS[part[0]][1] for part in parts)
+            max_bytes += PACK_OVERHEAD_BYTES + PACK_EVENT_OVERHEAD_BYTES
+        else:
+            max_bytes = sum(len(part.encode("utf-8")) if isinstance(part, str) else PLACEHOLDERS[part[0]][1]
+                            for part in parts)
+        if max_bytes > METADATA_MAX_BYTES:
+            raise TemplateError(f"Metadata can be up to {max_bytes} bytes long, "
+                                f"IVS limit is {METADATA_MAX_BYTES} bytes")
+
+        if message.lstrip().startswith(("{", "[")):
+            sample = "".join(part if isinstance(part, str) else PLACEHOLDERS[part[0]][0] % 1 for part in parts)
+            try:
+                json.loads(sample)
+            except json.JSONDecodeError as e:
+                raise TemplateError(f"Metadata template is not valid JSON: {e}") from None
+
+
+class BodyTemplate:
+    """Prebuilt PutMetadata JSON body {"channelArn", "metadata"} of one channel.
+    Template is compiled once into printf-style formats of the body and the metadata,
+    per send only the placeholder values are computed and spliced in"""
+
+    def __init__(self, arn: str, message: str, channel_name: str = ""):
+        self.arn = arn
+        self.message = message
+        self.channel_name = channel_name
+
+        parts = parse_template(message, channel_name)
+        metadata_format = ""
+        body_format = ""
+        self.getters = []
+        for part in parts:
+            if isinstance(part, str):
+                metadata_format += part.replace("%", "%%")
+                body_format += json.dumps(part)[1:-1].replace("%", "%%")
+            else:
+                name = part[0]
+                metadata_format += PLACEHOLDERS[name][0]
+                body_format += PLACEHOLDERS[name][0]
+                self.getters.append(name)
+        self.metadata_format = metadata_format
+
+        # Serialize with a marker in place of metadata and put the metadata format there
+        marker = "\x00"
+        serialized = json.dumps({"channelArn": arn, "metadata": marker})
+        prefix, suffix = serialized.rsplit(json.dumps(marker)[1:-1], 1)
+        self.prefix = prefix.encode("utf-8")
+        self.suffix = suffix.encode("utf-8")
+        self.body_format = (prefix.replace("%", "%%") + body_format + suffix.replace("%", "%%")).encode("utf-8")
+
+        # Index-only templates (the default "<message>_<index>") skip the getters entirely
+        self.index_only = self.getters == ["index"]
+        self.value_getters = tuple({"mono_ms": mono_ms, "wall_ms": wall_ms, "rand": rand}.get(name)
+                                   for name in self.getters)
+
+    def values(self, metadata_index: int) -> tuple:
+        if self.index_only:
+            return (metadata_index,)
+        return tuple(metadata_index if getter is None else getter() for getter in self.value_getters)
+
+    def render(self, metadata_index: int, metadata: str = None) -> tuple:
+        """Returns (request body, metadata) for the index, timestamps taken now.
+        Given metadata (e.g. from a replay file) is sent as is instead of the template"""
+        if metadata is not None:
+            return self.prefix + json.dumps(metadata)[1:-1].encode("utf-8") + self.suffix, metadata
+        values = self.values(metadata_index)
+        return self.body_format % values, self.metadata_format % values
+
+
+class PackedBodyTemplate(BodyTemplate):
+    """Coalesces logical events, generated at 'rate' per second, into packed payloads
+    of up to METADATA_MAX_BYTES (format above PACK_VERSION). Each render packs the events
+    generated since the previous one; events that don't fit wait for the next payload.
+    Retries of a send index get the same payload, so no event is lost or sent twice"""
+
+    # Payloads kept for retries; async engine can have a few send indexes in flight
+    CACHE_SIZE = 64
+
+    def __init__(self, arn: str, message: str, channel_name: str = "", rate: float = 1.0, first_index: int = 1):
+        super().__init__(arn, message, channel_name)
+        self.event_interval = 1 / rate
+        self.first_index = first_index
+        self.next_event = first_index
+        # Monotonic and wall clock time of the first event, set by the first render
+        self.start = None
+        self.start_wall_ms = None
+        self.packed = {}
+
+    def render(self, metadata_index: int, metadata: str = None) -> tuple:
+        if metadata is not None:
+            return super().render(metadata_index, metadata)
+        packed = self.packed.get(metadata_index)
+        if packed is None:
+            metadata = self.pack(time.monotonic())
+            packed = self.packed[metadata_index] = (self.prefix + json.dumps(metadata)[1:-1].encode("utf-8") +
+                                                    self.suffix, metadata)
+            if len(self.packed) > self.CACHE_SIZE:
+                del self.packed[next(iter(self.packed))]
+        return packed
+
+    def pack(self, now: float) -> str:
+        """Packed metadata of the events generated up to now that weren't sent yet"""
+        if self.start is None:
+            self.start = now
+            self.start_wall_ms = wall_ms()
+        generated_end = self.first_index + int((now - self.start) / self.event_interval) + 1
+        if generated_end <= self.next_event:
+            # Sends outpace events: the next event is generated now, later ones follow at 'rate' from it
+            self.start = now - (self.next_event - self.first_index) * self.event_interval
+            self.start_wall_ms = wall_ms() - round((now - self.start) * 1000)
+            generated_end = self.next_event + 1
+
+        first = self.next_event
+        first_ms = self.event_wall_ms(first)
+        deltas = []
+        events = []
+        size = len(f'{{"pack":{PACK_VERSION},"i":{first},"t":{first_ms},"dt":[],"e":[]}}')
+        for event_index in range(first, generated_end):
+            delta = str(self.event_wall_ms(event_index) - first_ms)
+            event = json.dumps(self.metadata_format % self.values(event_index), ensure_ascii=False)
+            event_size = len(delta) + len(event.encode("utf-8")) + (2 if events else 0)
+            if events and size + event_size > METADATA_MAX_BYTES:
+                break
+            size += event_size
+            deltas.append(delta)
+            events.append(event)
+        self.next_event = first + len(events)
+        return (f'{{"pack":{PACK_VERSION},"i":{first},"t":{first_ms},'
+                f'"dt":[{",".join(deltas)}],"e":[{",".join(events)}]}}')
+
+    def event_wall_ms(self, event_index: int) -> int:
+        return self.start_wall_ms + round((event_index - self.first_index) * self.event_interval * 1000)
+
+
+def unpack(metadata: str) -> list or None:
+    """Splits packed metadata into [(index, wall_ms, event metadata), ...]; None if metadata is not packed"""
+    if not metadata.startswith('{"pack":'):
+        return None
+    try:
+        packed = json.loads(metadata)
+        first_index = packed["i"]
+        first_ms = packed["t"]
+        return [(first_index + position, first_ms + delta, event)
+                for position, (delta, event) in enumerate(zip(packed["dt"], packed["e"]))]
+    except (ValueError, KeyError, TypeError):
+        return None
@@ -0,0 +1,129 @@
+"""Timing hooks around the phases of a send: render, sign, http, parse, log (and gui for Tk log drain).
+
+Instrumented code wraps a phase in `with profiling.phase("sign"):`. With no hook
+registered this returns a shared no-op context manager, so disabled profiling
+costs well under a microsecond per phase. Hooks are callables hook(phase_name, seconds)
+and are called from whichever thread ran the phase.
+"""
+import threading
+import time
+from contextlib import contextmanager
+import metrics
+
+PHASES = ("render", "sign", "http", "parse", "log", "gui")
+
+_hooks = []
+
+
+class _NoPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        return False
+
+
+_NO_PHASE = _NoPhase()
+
+
+class _Phase:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        elapsed = time.perf_counter() - self.start
+        for hook in _hooks:
+            hook(self.name, elapsed)
+        return False
+
+
+def phase(name: str):
+    """Context manager timing one phase of a send"""
+    if not _hooks:
+        return _NO_PHASE
+    return _Phase(name)
+
+
+def add_hook(hook) -> None:
+    # Replaced, not mutated, so phases running in other threads iterate a stable list
+    global _hooks
+    _hooks = _hooks + [hook]
+
+
+def remove_hook(hook) -> None:
+    global _hooks
+    _hooks = [registered for registered in _hooks if registered is not hook]
+
+
+class PhaseSampler:
+    """Built-in hook: per-phase count, total and latency histogram"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+
+    def __call__(self, name: str, seconds: float) -> None:
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                # Phases are much shorter than requests, start histogram at 1 us
+                histogram = self.histograms[name] = metrics.LogHistogram(min_value=1e-6)
+            histogram.record(seconds)
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            return {name: {"count": histogram.count,
+                           "total_ms": round(histogram.total * 1000, 3),
+                           "mean_us": round(histogram.mean() * 1e6, 1),
+                           "p99_us": round(histogram.percentile(99) * 1e6, 1),
+                           "max_us": round(histogram.max * 1e6, 1)}
+                    for name, histogram in sorted(self.histograms.items(), key=lambda item: PHASES.index(item[0])
+                                                  if item[0] in PHASES else len(PHASES))}
+
+    def report(self) -> str:
+        """One-line per-phase breakdown: mean/p99 and share of total measured time"""
+        phases = self.to_dict()
+        measured_ms = sum(phase_stats["total_ms"] for phase_stats in phases.values()) or 1
+        return "Phase timing (mean/p99 us, share): " + ", ".join(
+            f"{name} {phase_stats['mean_us']:.0f}/{phase_stats['p99_us']:.0f} "
+            f"{phase_stats['total_ms'] / measured_ms:.0%}"
+            for name, phase_stats in phases.items())
+
+
+@contextmanager
+def sampling(enabled: bool = True):
+    """Registers a PhaseSampler for the duration of the block, yields it (None if not enabled)"""
+    if not enabled:
+        yield None
+        return
+    sampler = PhaseSampler()
+    add_hook(sampler)
+    try:
+        yield sampler
+    finally:
+        remove_hook(sampler)
+
+
+@contextmanager
+def cprofile_capture(path: str):
+    """Runs the block under cProfile and dumps stats to path (no-op for empty path).
+    cProfile sees only the calling thread: the whole async engine, but not the
+    worker threads of sync fan-out"""
+    if not path:
+        yield
+        return
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
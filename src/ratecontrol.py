@@ -0,0 +1,125 @@
+import random
+import time
+import responses
+
+# Failure kinds
+THROTTLE = "throttle"
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+
+
+def classify_failure(status: int or None, error_class: str) -> str:
+    category = responses.classify(status, error_class)
+    if category == responses.THROTTLE:
+        return THROTTLE
+    # Server errors and connection failures before anything was sent are worth retrying.
+    # A request cut off later (read timeout, dropped connection) may have been delivered: not retried
+    if category == responses.SERVER or (category == responses.NETWORK
+                                        and not responses.maybe_delivered(status, error_class)):
+        return TRANSIENT
+    return PERMANENT
+
+
+class RateController:
+    """Retry and adaptive rate policy of one channel stream.
+    Throttling and transient errors are retried on the same index after a
+    jittered exponential backoff; throttling also stretches the send interval,
+    which then ramps back to the configured one with every success"""
+
+    def __init__(self, base_interval: float, max_retries: int, backoff_base: float, backoff_max: float,
+                 throttle_slowdown: float, recovery_speedup: float, settings=None):
+        # Configured interval is followed while running if settings are given (Delay changed via control API)
+        self.settings = settings
+        self.base_interval = base_interval
+        self.interval = base_interval
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.throttle_slowdown = throttle_slowdown
+        self.recovery_speedup = recovery_speedup
+        # Retries so far of each index being sent, per index: the async engine has many in flight at once
+        self.attempts = {}
+        self.last_slowdown = None
+
+        # Log note about the last handled result (retry or rate recovery info)
+        self.note = ""
+
+        # Counters of the whole run
+        self.throttled = 0
+        self.transient = 0
+        self.retries = 0
+
+    def handle(self, result, schedule, metadata_index: int) -> float or None:
+        """Applies result of a send (data.SendResult) to retry/rate state and to the schedule.
+        Returns delay before retrying the same index, None when the index is done"""
+        self.note = ""
+        if self.settings is not None and self.settings.wait != self.base_interval:
+            self.retune(self.settings.wait, schedule)
+        attempt = self.attempts.pop(metadata_index, 0)
+        if not result.failed:
+            if self.on_success():
+                schedule.set_interval(self.interval)
+                if self.interval == self.base_interval:
+                    self.note = f" (rate restored, {self.summary()})"
+            if attempt:
+                schedule.skip_missed()
+            return None
+
+        kind = classify_failure(result.status, result.error_class)
+        delay = self.on_failure(kind, attempt)
+        if delay is None:
+            if result.maybe_delivered:
+                self.note = " (may have been delivered, not retried)"
+            if attempt:
+                schedule.skip_missed()
+            return None
+        if kind == THROTTLE:
+            schedule.set_interval(self.interval)
+        self.attempts[metadata_index] = attempt + 1
+        self.note = (f" ({kind}, retry {attempt + 1}/{self.max_retries} of index {metadata_index} "
+                     f"in {delay:.2f} s, interval {self.interval:.2f} s)")
+        return delay
+
+    def retune(self, base_interval: float, schedule) -> None:
+        """Switches to a new configured interval from the next tick on, a throttling slowdown is kept in proportion"""
+        self.interval = base_interval * self.interval / self.base_interval if self.base_interval else base_interval
+        self.base_interval = base_interval
+        schedule.set_interval(self.interval)
+        self.note = f" (interval changed to {base_interval:g} s)"
+
+    def on_failure(self, kind: str, attempt: int = 0) -> float or None:
+        """Returns delay before retrying the same index (retried attempt times so far), None if failure is final"""
+        if kind == PERMANENT or attempt >= self.max_retries:
+            return None
+
+        if kind == THROTTLE:
+            self.throttled += 1
+
+            # Pipelined requests get throttled together - slow down once per interval
+            now = time.monotonic()
+            if self.last_slowdown is None or now - self.last_slowdown >= self.interval:
+                self.last_slowdown = now
+                max_interval = max(self.backoff_max, self.base_interval)
+                self.interval = min(self.interval * self.throttle_slowdown, max_interval)
+        else:
+            self.transient += 1
+
+        self.retries += 1
+
+        # "Full jitter" backoff spreads retries of many channels apart
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt + 1)))
+
+    def on_success(self) -> bool:
+        """Returns True if send interval was changed (ramped back towards the base one)"""
+        if self.interval <= self.base_interval:
+            return False
+        self.interval = max(self.base_interval, self.interval / self.recovery_speedup)
+        return True
+
+    def summary(self) -> str:
+        return f"retries: {self.retries}, throttled: {self.throttled}, transient errors: {self.transient}"
+
+
+def from_settings(settings) -> RateController:
+    return RateController(settings.wait, settings.send_retries, settings.backoff_base, settings.backoff_max,
+                          settings.throttle_slowdown, settings.recovery_speedup, settings)
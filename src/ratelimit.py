@@ -0,0 +1,64 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by all senders of a run.
+    reserve() takes a token and returns how long the caller must wait before
+    using it, so it works both for blocking threads and asyncio coroutines.
+    A bucket with a parent (channel limit under the account limit) takes a token of both.
+    Rate 0 (or below) means unlimited"""
+
+    def __init__(self, rate: float, burst: float = 1, parent: "TokenBucket" = None):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.parent = parent
+
+    def _refill(self) -> None:
+        # Refill tokens for the time passed since the last update
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        delay = 0.0
+        if self.rate > 0:
+            with self.lock:
+                self._refill()
+
+                # Going below zero queues the caller behind earlier reservations
+                self.tokens -= 1
+                if self.tokens < 0:
+                    delay = -self.tokens / self.rate
+        if self.parent is not None:
+            return max(delay, self.parent.reserve())
+        return delay
+
+    def try_acquire(self) -> bool:
+        """Takes a token only if one is available right now (parent is not asked)"""
+        if self.rate <= 0:
+            return True
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def acquire(self, stop_event: threading.Event) -> bool:
+        """Blocks until a token is available. Returns False if stopped while waiting"""
+        delay = self.reserve()
+        if delay > 0:
+            return not stop_event.wait(delay)
+        return not stop_event.is_set()
+
+
+def from_settings(settings, arns) -> dict:
+    """{arn: bucket} of a run: IVS limits PutMetadata per channel and per account,
+    so each channel gets its own bucket under one account bucket shared by all of them"""
+    account = TokenBucket(settings.rate_limit_tps, settings.rate_limit_tps)
+    return {arn: TokenBucket(settings.channel_rate_limit_tps, settings.channel_rate_limit_tps, account)
+            for arn in arns}
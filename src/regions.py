@@ -0,0 +1,74 @@
+"""Routing of channels to their regional IVS endpoints.
+
+The region is taken from each channel ARN (arn:aws:ivs:<region>:<account>:channel/<id>),
+so every channel is sent to https://ivs.<region>.amazonaws.com/PutMetadata and
+signed for its own region. Channels of one region share a signer (and a connection
+pool in the send engines). 'endpoint_url' in settings overrides the regional
+endpoints, e.g. for a local stand-in server; "{region}" in it is replaced with the
+channel's region.
+"""
+from typing import NamedTuple
+import sigv4
+
+# Used for ARNs without a region (e.g. hand-edited settings.json)
+DEFAULT_REGION = "us-west-2"
+
+PARTITION_DOMAINS = {"aws": "amazonaws.com", "aws-cn": "amazonaws.com.cn"}
+
+
+def parse_arn(arn: str) -> tuple:
+    """Returns (partition, region) of a channel ARN"""
+    parts = arn.strip().split(":", 5)
+    if len(parts) == 6 and parts[0] == "arn" and parts[3]:
+        return parts[1] or "aws", parts[3]
+    return "aws", DEFAULT_REGION
+
+
+def endpoint_url(region: str, partition: str = "aws", override: str = "") -> str:
+    if override:
+        return override.replace("{region}", region)
+    domain = PARTITION_DOMAINS.get(partition, PARTITION_DOMAINS["aws"])
+    return f"https://ivs.{region}.{domain}/PutMetadata"
+
+
+class Route(NamedTuple):
+    region: str
+    url: str
+    signer: sigv4.Signer
+
+
+class Router:
+    """Route of every channel of a run. Has the Signer.update_credentials interface,
+    so credential refresh swaps credentials of all regional signers at once"""
+
+    def __init__(self, access_key: str, secret_key: str, session_token: str, channels: dict,
+                 endpoint_override: str = ""):
+        self.signers = {}
+        self.routes = {}
+        for arn in channels.values():
+            partition, region = parse_arn(arn)
+            signer = self.signers.get(region)
+            if signer is None:
+                signer = self.signers[region] = sigv4.Signer(access_key, secret_key, session_token, region=region)
+            self.routes[arn] = Route(region, endpoint_url(region, partition, endpoint_override), signer)
+
+    @property
+    def regions(self) -> list:
+        return list(self.signers)
+
+    def route(self, arn: str) -> Route:
+        return self.routes[arn]
+
+    def update_credentials(self, access_key: str, secret_key: str, session_token: str) -> None:
+        for signer in self.signers.values():
+            signer.update_credentials(access_key, secret_key, session_token)
+
+    def summary(self) -> str:
+        """Log line with endpoint and channel count of each region"""
+        channel_counts = {}
+        endpoints = {}
+        for route in self.routes.values():
+            channel_counts[route.region] = channel_counts.get(route.region, 0) + 1
+            endpoints[route.region] = route.url
+        return "Endpoints: " + ", ".join(f"{region} {url} ({channel_counts[region]} ch)"
+                                         for region, url in endpoints.items())
@@ -0,0 +1,98 @@
+import json
+
+# Error categories of a failed PutMetadata call
+THROTTLE = "throttle"
+VALIDATION = "validation"
+AUTH = "auth"
+CHANNEL_NOT_LIVE = "channel_not_live"
+NOT_FOUND = "not_found"
+SERVER = "server"
+NETWORK = "network"
+OTHER = "other"
+
+# x-amzn-ErrorType -> category
+ERROR_TYPE_CATEGORIES = {
+    "ThrottlingException": THROTTLE,
+    "TooManyRequestsException": THROTTLE,
+    "ValidationException": VALIDATION,
+    "SerializationException": VALIDATION,
+    "AccessDeniedException": AUTH,
+    "UnrecognizedClientException": AUTH,
+    "InvalidSignatureException": AUTH,
+    "ExpiredTokenException": AUTH,
+    "IncompleteSignatureException": AUTH,
+    "MissingAuthenticationTokenException": AUTH,
+    "ChannelNotBroadcasting": CHANNEL_NOT_LIVE,
+    "ResourceNotFoundException": NOT_FOUND,
+    "InternalServerException": SERVER,
+    "ServiceUnavailableException": SERVER,
+}
+
+# Failures without a response that happened while opening the connection, before anything
+# was sent (requests/urllib3 and aiohttp class names)
+CONNECT_ERROR_CLASSES = {
+    "ConnectTimeout",
+    "NewConnectionError",
+    "NameResolutionError",
+    "ClientConnectorError",
+    "ClientConnectorDNSError",
+    "ClientConnectorSSLError",
+    "ClientConnectorCertificateError",
+    "ClientProxyConnectionError",
+    "ConnectionTimeoutError",
+}
+
+# Fallback by status code when the error type header is missing
+STATUS_CATEGORIES = {400: VALIDATION, 401: AUTH, 403: AUTH, 404: NOT_FOUND, 429: THROTTLE}
+
+
+def is_success(status: int) -> bool:
+    # PutMetadata answers 204 with an empty body, the body is never needed for success
+    return 200 <= status < 300
+
+
+def get_error_class(status: int, headers) -> str:
+    # AWS puts error type into x-amzn-ErrorType header, e.g. "ThrottlingException:http://..."
+    error_type = headers.get("x-amzn-ErrorType")
+    if error_type:
+        return error_type.partition(":")[0]
+    return f"HTTP {status}"
+
+
+def classify(status: int or None, error_class: str) -> str:
+    """Category of a failed call from its status and error class only, the body isn't parsed"""
+    if status is None:
+        # No response: connection reset, timeout, ...
+        return NETWORK
+    category = ERROR_TYPE_CATEGORIES.get(error_class)
+    if category is not None:
+        return category
+    if status >= 500:
+        return SERVER
+    return STATUS_CATEGORIES.get(status, OTHER)
+
+
+def maybe_delivered(status: int or None, error_class: str) -> bool:
+    """No response, but the request may have reached the server (read timeout, connection dropped
+    after sending). PutMetadata isn't idempotent, sending it again could insert the metadata twice"""
+    return status is None and error_class not in CONNECT_ERROR_CLASSES
+
+
+def get_error_message(body: bytes or str) -> str:
+    """First line of the "message" of a JSON error body. Parsed only for failed calls"""
+    if not body:
+        return "No message found in the response."
+    try:
+        body_json = json.loads(body, strict=False)
+    except ValueError as e:
+        return f"Error decoding response JSON: {e}"
+    if not isinstance(body_json, dict):
+        return "No message found in the response."
+
+    message = body_json.get("message", body_json.get("Message"))
+    if message is None:
+        # Rare spellings, e.g. "MESSAGE"
+        message = next((value for key, value in body_json.items() if key.lower() == "message"), None)
+    if message is None:
+        return "No message found in the response."
+    return str(message).partition("\n")[0]
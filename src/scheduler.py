@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+import schedules
+
+# Lateness below this value is scheduler/OS jitter and is not reported in logs
+LATENESS_REPORT_THRESHOLD = 0.005
+
+
+class Scheduler:
+    """Paces sends on absolute deadlines of the monotonic clock.
+    Deadline of a tick is start + its pattern offset (N * interval by default),
+    so request time and late wake-ups never add up into drift of the
+    index->timestamp mapping. Optional max_ticks/max_duration (0 = unlimited)
+    end the schedule. set_interval() re-anchors the schedule at the last tick
+    for rate changes and stretches following pattern offsets accordingly"""
+
+    def __init__(self, interval: float, stop_event: threading.Event, max_ticks: int = 0, max_duration: float = 0,
+                 metrics=None, pattern=None):
+        self.base_interval = interval
+        self.interval = interval
+        self.stop_event = stop_event
+        self.metrics = metrics
+        self.max_ticks = max_ticks
+        self.max_duration = max_duration
+        self.start = None
+        self.tick = 0
+
+        # (offset, metadata) of ticks, see schedules module
+        self.pattern = pattern if pattern is not None else schedules.constant(interval)
+        self.next_tick = None
+        self.last_offset = 0.0
+        self.last_deadline = None
+
+        # Metadata of the current tick, None = render message template
+        self.metadata = None
+
+        # Deadline of the tick at anchor_offset, later ticks follow it stretched by interval / base_interval
+        self.anchor = None
+        self.anchor_offset = 0.0
+        self.stretch = 1.0
+
+        self.lateness = 0.0
+        self.max_lateness = 0.0
+
+    def peek_tick(self) -> tuple or None:
+        """Returns (offset, metadata) of the next tick, None when pattern is over"""
+        if self.next_tick is None:
+            self.next_tick = next(self.pattern, None)
+        return self.next_tick
+
+    def next_deadline(self) -> float or None:
+        """Returns monotonic deadline of the next tick or None when schedule is over"""
+        if self.start is None:
+            self.start = self.anchor = time.monotonic()
+        if self.max_ticks and self.tick >= self.max_ticks:
+            return None
+
+        next_tick = self.peek_tick()
+        if next_tick is None:
+            return None
+        deadline = self.anchor + (next_tick[0] - self.anchor_offset) * self.stretch
+        # Elapsed time counts too: sends held back by rate limit or backoff must not stretch the run
+        if self.max_duration and max(deadline, time.monotonic()) - self.start >= self.max_duration:
+            return None
+        return deadline
+
+    def set_interval(self, interval: float) -> None:
+        """Changes interval of following ticks. Next deadline is last tick's deadline
+        plus new interval, but never in the past - missed ticks are not sent in a burst"""
+        stretch = interval / self.base_interval if self.base_interval else 1.0
+        if self.last_deadline is not None:
+            next_tick = self.peek_tick()
+            next_gap = (next_tick[0] - self.last_offset) * stretch if next_tick else 0.0
+            self.anchor = max(self.last_deadline, time.monotonic() - next_gap)
+            self.anchor_offset = self.last_offset
+        self.interval = interval
+        self.stretch = stretch
+
+    def skip_missed(self) -> None:
+        """Re-anchors the schedule as if the last tick was sent now, e.g. after its send was
+        retried: ticks missed during the backoff are skipped instead of sent in a burst"""
+        if self.last_deadline is None:
+            return
+        self.anchor = self.last_deadline = max(self.last_deadline, time.monotonic())
+        self.anchor_offset = self.last_offset
+
+    def mark(self, deadline: float) -> None:
+        """Records that tick with given deadline is being sent now"""
+        self.last_offset, self.metadata = self.next_tick
+        self.next_tick = None
+        self.last_deadline = deadline
+        self.lateness = max(time.monotonic() - deadline, 0.0)
+        self.max_lateness = max(self.max_lateness, self.lateness)
+        self.tick += 1
+        if self.metrics is not None:
+            self.metrics.record_lateness(self.lateness)
+
+    def wait_next(self) -> bool:
+        """Blocks until the next deadline. Returns False as soon as stop_event is set
+        or schedule is over"""
+        deadline = self.next_deadline()
+        if deadline is None:
+            return False
+
+        # Event.wait wakes immediately when stop is requested
+        remaining = deadline - time.monotonic()
+        if remaining > 0 and self.stop_event.wait(remaining):
+            return False
+        if self.stop_event.is_set():
+            return False
+
+        self.mark(deadline)
+        return True
+
+    async def async_wait_next(self) -> bool:
+        """wait_next() for asyncio engines, stop is handled by cancelling the task"""
+        deadline = self.next_deadline()
+        if deadline is None:
+            return False
+        await asyncio.sleep(max(deadline - time.monotonic(), 0))
+        self.mark(deadline)
+        return True
+
+    def lateness_note(self) -> str:
+        """Returns text to append to a log line if the last tick was noticeably late"""
+        if self.lateness < LATENESS_REPORT_THRESHOLD:
+            return ""
+        return f" (late {round(self.lateness * 1000)} ms)"
+
+
+def from_settings(settings, window) -> Scheduler:
+    return Scheduler(settings.wait, window.stop_event, settings.send_count, settings.send_duration,
+                     window.metrics, schedules.create(settings.schedule, settings.wait))
@@ -0,0 +1,161 @@
+"""Send patterns of a channel stream.
+
+A pattern is an iterator of (offset, metadata) pairs: offset is seconds from the
+start of the stream, metadata is the message to send at that time or None to
+render the message template. Patterns are generated lazily, so they can be
+endless and replay files are never loaded into memory.
+
+Pattern spec (settings "schedule" / CLI --schedule), rates in messages per second:
+
+    constant                                   every 'wait' seconds
+    burst:size=5,spacing=0.05                  5 messages 50 ms apart every 'wait' seconds
+    linear:from=1,to=10,over=60                rate ramps linearly from 1 to 10 over 60 s
+    step:from=1,to=10,steps=4,every=30         rate steps 1, 4, 7, 10, each held for 30 s
+    poisson:rate=2                             random (Poisson) arrivals, default rate 1 / 'wait'
+    replay:/path/to/timeline.tsv               recorded timeline, see replay()
+"""
+import itertools
+import random
+
+# Parameters of each pattern kind with their defaults (None = required)
+PATTERN_PARAMETERS = {
+    "constant": {},
+    "burst": {"size": None, "spacing": 0.0},
+    "linear": {"from": None, "to": None, "over": None},
+    "step": {"from": None, "to": None, "steps": None, "every": None},
+    "poisson": {"rate": 0.0},  # 0 = 1 / 'wait'
+    "replay": {},
+}
+
+
+class ScheduleError(ValueError):
+    pass
+
+
+def constant(interval: float):
+    return ((tick * interval, None) for tick in itertools.count())
+
+
+def burst(interval: float, size: int, spacing: float):
+    for burst_index in itertools.count():
+        burst_start = burst_index * interval
+        for message_index in range(size):
+            yield burst_start + message_index * spacing, None
+
+
+def linear_ramp(start_rate: float, end_rate: float, duration: float):
+    offset = 0.0
+    while True:
+        yield offset, None
+        progress = min(offset / duration, 1.0) if duration else 1.0
+        offset += 1 / (start_rate + (end_rate - start_rate) * progress)
+
+
+def step_ramp(start_rate: float, end_rate: float, steps: int, step_duration: float):
+    offset = 0.0
+    while True:
+        yield offset, None
+        step = min(int(offset / step_duration), steps - 1) if step_duration else steps - 1
+        offset += 1 / (start_rate + (end_rate - start_rate) * step / max(steps - 1, 1))
+
+
+def poisson(rate: float, rng: random.Random = None):
+    rng = rng or random.Random()
+    offset = 0.0
+    while True:
+        yield offset, None
+        offset += rng.expovariate(rate)
+
+
+def replay(path: str):
+    """Streams a recorded timeline: one "<timestamp> <metadata>" line per message
+    (tab or space separated). Timestamps are seconds (e.g. Unix time), the first
+    one becomes offset 0. Empty metadata renders the message template. Empty lines,
+    lines starting with '#' and lines without a valid timestamp are skipped"""
+    first_timestamp = None
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            line = line.rstrip("\r\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            separator = "\t" if "\t" in line else " "
+            timestamp, _, metadata = line.partition(separator)
+            try:
+                timestamp = float(timestamp)
+            except ValueError:
+                continue
+            if first_timestamp is None:
+                first_timestamp = timestamp
+            yield max(timestamp - first_timestamp, 0.0), metadata or None
+
+
+def parse_spec(spec: str) -> tuple:
+    """Returns (kind, parameters) of a pattern spec, raises ScheduleError if it's not valid"""
+    kind, _, arguments = spec.strip().partition(":")
+    kind = kind.strip().lower() or "constant"
+    if kind not in PATTERN_PARAMETERS:
+        raise ScheduleError(f"Unknown schedule {kind!r}, available: {', '.join(PATTERN_PARAMETERS)}")
+
+    if kind == "replay":
+        # Everything after "replay:" is the file path
+        if not arguments:
+            raise ScheduleError("Schedule 'replay' needs a file path: replay:/path/to/timeline.tsv")
+        return kind, {"path": arguments.strip()}
+
+    parameters = dict(PATTERN_PARAMETERS[kind])
+    for argument in filter(None, (argument.strip() for argument in arguments.split(","))):
+        name, _, value = argument.partition("=")
+        name = name.strip()
+        if name not in parameters:
+            raise ScheduleError(f"Unknown parameter {name!r} of schedule {kind!r}")
+        try:
+            parameters[name] = float(value)
+        except ValueError:
+            raise ScheduleError(f"Parameter {name!r} of schedule {kind!r} must be a number") from None
+    return kind, parameters
+
+
+def validate_spec(spec: str, interval: float) -> None:
+    """Raises ScheduleError if a pattern can't be created from the spec (checked before a run starts)"""
+    kind, parameters = parse_spec(spec)
+    missing = [name for name, value in parameters.items() if value is None]
+    if missing:
+        raise ScheduleError(f"Schedule {kind!r} needs {', '.join(f'{name}=...' for name in missing)}")
+
+    if kind == "burst" and parameters["size"] < 1:
+        raise ScheduleError("Burst size must be at least 1")
+    if kind == "burst" and (parameters["size"] - 1) * parameters["spacing"] >= interval > 0:
+        raise ScheduleError("Burst doesn't fit into delay between bursts, lower spacing or size")
+    if kind in ("linear", "step") and (parameters["from"] <= 0 or parameters["to"] <= 0):
+        raise ScheduleError("Ramp rates must be positive")
+    if kind == "step" and parameters["steps"] < 1:
+        raise ScheduleError("Step count must be at least 1")
+    if kind == "poisson" and parameters["rate"] < 0:
+        raise ScheduleError("Poisson rate must be positive")
+    if kind == "poisson" and not parameters["rate"] and interval <= 0:
+        raise ScheduleError("Schedule 'poisson' needs rate=... when delay is 0")
+    if kind == "replay":
+        # Open now, so a wrong path is reported before anything is sent
+        try:
+            with open(parameters["path"], encoding="utf-8"):
+                pass
+        except OSError as e:
+            raise ScheduleError(f"Replay file can't be opened: {e}") from None
+
+
+def create(spec: str, interval: float):
+    """Returns a new pattern iterator for the spec; interval is the 'wait' setting"""
+    kind, parameters = parse_spec(spec)
+    match kind:
+        case "constant":
+            return constant(interval)
+        case "burst":
+            return burst(interval, int(parameters["size"]), parameters["spacing"])
+        case "linear":
+            return linear_ramp(parameters["from"], parameters["to"], parameters["over"])
+        case "step":
+            return step_ramp(parameters["from"], parameters["to"], int(parameters["steps"]), parameters["every"])
+        case "poisson":
+            return poisson(parameters["rate"] or 1 / interval)
+        case "replay":
+            return replay(parameters["path"])
@@ -2,9 +2,23 @@ from cx_Freeze import setup, Executable
 
 version_nr = "0.5.7"
 
+build_exe_options = {
+    # Imported lazily (inside functions), listed so the bundle never misses them
+    "includes": ["api_calls", "async_engine", "exporter", "control"],
+    # Modules pulled in by the standard library or dependencies but never used by the app
+    "excludes": ["unittest", "pydoc", "pydoc_data", "doctest", "test", "lib2to3", "distutils", "setuptools",
+                 "pip", "xmlrpc", "sqlite3", "curses", "tkinter.test", "idlelib", "turtledemo",
+                 "bench", "cli", "mock_ivs", "correlate"],
+    # Store precompiled, docstring-free bytecode in the library zip
+    "optimize": 2,
+    "zip_include_packages": ["*"],
+    "zip_exclude_packages": [],
+}
+
 setup(
     name="SMST",
     version=version_nr,
     description="Sequential Metadata Sending Tool",
+    options={"build_exe": build_exe_options},
     executables=[Executable("gui.py", base=None, target_name="SMST "+version_nr)],
 )
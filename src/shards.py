@@ -0,0 +1,266 @@
+"""Process-pool mode: fan-out channels split across worker processes.
+
+One process signs, encodes and handles responses under a single GIL, so with
+"processes" > 1 the channels of a fan-out run are dealt round-robin into shards
+and each shard runs the regular send engine (api_calls.run_engine) in its own
+spawned worker process. The parent only merges results:
+
+- every FLUSH_INTERVAL seconds a worker sends one message over its one-way pipe
+  with the log lines and the send records of that interval, packed with struct
+  (latency as double, HTTP status as unsigned short, 0 = no response; error
+  classes only for failed sends), which the parent replays into the run metrics
+- Stop sets a shared event, every worker stops its engine and flushes its last
+  records; the parent waits for all of them before the run ends
+- settings changed during the run (Delay via the control API, newly pasted
+  credentials) go to the workers over a second one-way pipe
+- the account rate limit is split between workers by their share of channels,
+  each channel keeps its own per-channel limit in full
+
+Journal and cProfile files get a ".shard<N>" suffix per worker.
+"""
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import struct
+import threading
+import data
+
+# Seconds between result messages of a worker
+FLUSH_INTERVAL = 0.1
+
+# Seconds to wait for workers to exit after they were asked to stop
+JOIN_TIMEOUT = 10
+
+SEND_RECORD = struct.Struct("<dH")
+LATENESS_RECORD = struct.Struct("<d")
+
+# Values of AppSettings set for a single run and not saved, passed to workers too
+RUN_SETTINGS = ("send_count", "send_duration", "headers")
+
+# Values of AppSettings followed by a running send loop, forwarded to workers when they change
+LIVE_SETTINGS = ("wait", "credentials")
+
+
+def enabled(settings: data.AppSettings, channels: dict) -> bool:
+    return settings.processes > 1 and len(channels) > 1
+
+
+def split_channels(channels: dict, shards_count: int) -> list:
+    """Deals channels round-robin into shards_count {name: arn} dicts"""
+    shards = [{} for _ in range(min(shards_count, len(channels)))]
+    for position, (name, arn) in enumerate(channels.items()):
+        shards[position % len(shards)][name] = arn
+    return shards
+
+
+def shard_path(path: str, shard_id: int) -> str:
+    """journal.jsonl -> journal.shard1.jsonl"""
+    if not path:
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}.shard{shard_id}{extension}"
+
+
+def worker_settings(settings: data.AppSettings, shard_id: int, rate_share: float) -> dict:
+    """Picklable copy of the run settings for a worker, with its share of the account rate limit
+    (channel_rate_limit_tps applies per channel, so it's passed on unchanged)"""
+    values = {key: getattr(settings, key) for key in settings.__annotations__}
+    values.update((key, getattr(settings, key)) for key in RUN_SETTINGS)
+    values["processes"] = 1
+    values["rate_limit_tps"] = settings.rate_limit_tps * rate_share
+    values["journal_path"] = shard_path(settings.journal_path, shard_id)
+    values["profile_path"] = shard_path(settings.profile_path, shard_id)
+    return values
+
+
+def run(window, settings: data.AppSettings, channels: dict) -> None:
+    """Runs shards in worker processes until Stop is pressed or all of them finished"""
+    # Spawned, not forked: the parent has running threads (Tk, credentials, soak), fork would copy their locks
+    context = multiprocessing.get_context("spawn")
+    stop_event = context.Event()
+    connections = {}
+    update_senders = {}
+    shards = split_channels(channels, settings.processes)
+    for shard_id, shard_channels in enumerate(shards, start=1):
+        receiver, sender = context.Pipe(duplex=False)
+        update_receiver, update_sender = context.Pipe(duplex=False)
+        rate_share = len(shard_channels) / len(channels)
+        process = context.Process(target=worker_main, name=f"shard{shard_id}", daemon=True,
+                                  args=(shard_id, worker_settings(settings, shard_id, rate_share), shard_channels,
+                                        stop_event, sender, update_receiver))
+        process.start()
+        # Parent keeps only the receiving end, so EOF is seen when the worker exits
+        sender.close()
+        update_receiver.close()
+        connections[receiver] = process
+        update_senders[receiver] = update_sender
+    window.write_to_log(f"Started {len(shards)} worker processes: " +
+                        "; ".join(", ".join(shard_channels) for shard_channels in shards))
+
+    processes = list(connections.values())
+    live_values = {key: getattr(settings, key) for key in LIVE_SETTINGS}
+    try:
+        while connections:
+            if window.stop_event.is_set():
+                stop_event.set()
+            forward_changes(settings, live_values, update_senders.values())
+            for receiver in multiprocessing.connection.wait(list(connections), timeout=0.2):
+                try:
+                    apply_message(window, receiver.recv())
+                except EOFError:
+                    process = connections.pop(receiver)
+                    receiver.close()
+                    update_senders.pop(receiver).close()
+                    process.join(JOIN_TIMEOUT)
+                    if process.exitcode:
+                        window.write_to_log(f"{data.WARNING_PREFIX}Worker {process.name} exited "
+                                            f"with code {process.exitcode}")
+    finally:
+        stop_event.set()
+        for update_sender in update_senders.values():
+            update_sender.close()
+        for process in processes:
+            process.join(JOIN_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+
+
+def forward_changes(settings: data.AppSettings, live_values: dict, update_senders) -> None:
+    """Sends LIVE_SETTINGS changed since the last call to all workers"""
+    changes = {key: getattr(settings, key) for key in LIVE_SETTINGS if getattr(settings, key) != live_values[key]}
+    if not changes:
+        return
+    live_values.update(changes)
+    for update_sender in update_senders:
+        try:
+            update_sender.send(changes)
+        except OSError:
+            # Worker is exiting, its EOF is handled by the receive loop
+            pass
+
+
+def apply_message(window, message: tuple) -> None:
+    """Replays a worker's batch into the parent's log and metrics"""
+    log_lines, sends, errors, lateness, failures = message
+    send_metrics = window.metrics
+    error_classes = dict(errors)
+    for position, (latency, status) in enumerate(SEND_RECORD.iter_unpack(sends)):
+        send_metrics.record_send(latency, status or None, error_classes.get(position))
+    for (value,) in LATENESS_RECORD.iter_unpack(lateness):
+        send_metrics.record_lateness(value)
+    for _ in range(failures):
+        send_metrics.record_failure()
+    for log_line in log_lines:
+        window.write_to_log(log_line)
+
+
+class ShardMetrics:
+    """Stand-in for metrics.SendMetrics in a worker: buffers records until the next flush"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sends = bytearray()
+        self.errors = []
+        self.lateness = bytearray()
+        self.failures = 0
+
+    def record_send(self, latency: float, status: int or None, error_class: str or None = None) -> None:
+        with self.lock:
+            if error_class is not None:
+                self.errors.append((len(self.sends) // SEND_RECORD.size, error_class))
+            self.sends += SEND_RECORD.pack(latency, status or 0)
+
+    def record_lateness(self, lateness: float) -> None:
+        with self.lock:
+            self.lateness += LATENESS_RECORD.pack(lateness)
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+
+    def take(self) -> tuple:
+        with self.lock:
+            batch = (bytes(self.sends), self.errors, bytes(self.lateness), self.failures)
+            self.sends.clear()
+            self.errors = []
+            self.lateness.clear()
+            self.failures = 0
+        return batch
+
+
+class ShardWindow:
+    """Stand-in for MainTab in a worker: log lines and metrics go to the parent"""
+
+    def __init__(self, channels: dict, connection):
+        self.connection = connection
+        self.stop_event = threading.Event()
+        self.metrics = ShardMetrics()
+        self.run_credentials = None
+        self.json_entry = None
+        self.log_lines = []
+        self.log_lock = threading.Lock()
+        # A single-channel shard runs without fan-out, its lines would have no channel name
+        self.log_prefix = f"[{next(iter(channels))}] " if len(channels) == 1 else ""
+
+    def write_to_log(self, msg: str) -> None:
+        if self.log_prefix:
+            if msg.startswith(data.WARNING_PREFIX):
+                msg = f"{data.WARNING_PREFIX}{self.log_prefix}{msg[len(data.WARNING_PREFIX):]}"
+            else:
+                msg = f"{self.log_prefix}{msg}"
+        with self.log_lock:
+            self.log_lines.append(msg)
+
+    def stop_action(self, widget_to_focus=None) -> None:
+        self.stop_event.set()
+
+    def flush(self) -> None:
+        with self.log_lock:
+            log_lines, self.log_lines = self.log_lines, []
+        sends, errors, lateness, failures = self.metrics.take()
+        if log_lines or sends or lateness or failures:
+            self.connection.send((log_lines, sends, errors, lateness, failures))
+
+
+def worker_main(shard_id: int, settings_values: dict, channels: dict, stop_event, connection,
+                update_connection) -> None:
+    """Entry point of a worker process"""
+    import api_calls
+    import credentials
+
+    # Ctrl+C reaches the whole process group: workers stop only through the shared event set by the parent
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    settings = data.AppSettings
+    for key, value in settings_values.items():
+        setattr(settings, key, value)
+    window = ShardWindow(channels, connection)
+
+    def forward() -> None:
+        # Passes the shared stop and settings changes to the engine and flushes results until the shard is done
+        while not window.stop_event.is_set():
+            if stop_event.wait(FLUSH_INTERVAL):
+                window.stop_event.set()
+            try:
+                while update_connection.poll():
+                    for key, value in update_connection.recv().items():
+                        setattr(settings, key, value)
+            except (EOFError, OSError):
+                pass
+            window.flush()
+
+    forwarder = threading.Thread(target=forward, name="forward", daemon=True)
+    forwarder.start()
+    try:
+        # Each worker reads credentials from the source itself and refreshes them on its own
+        credential_provider = credentials.from_settings(settings)
+        api_calls.run_engine(window, settings, channels, credential_provider, credential_provider.get())
+    except Exception as e:
+        window.write_to_log(f"{data.WARNING_PREFIX}Worker shard{shard_id} failed: {type(e).__name__}: {e}")
+    finally:
+        window.stop_event.set()
+        forwarder.join()
+        window.flush()
+        connection.close()
+        update_connection.close()
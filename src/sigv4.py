@@ -0,0 +1,108 @@
+import hashlib
+import hmac
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+ALGORITHM = "AWS4-HMAC-SHA256"
+
+
+def _hmac(key: bytes, msg: str) -> bytes:
+    return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).digest()
+
+
+def derive_signing_key(secret_key: str, date_stamp: str, region: str, service: str) -> bytes:
+    k_date = _hmac(f"AWS4{secret_key}".encode("utf-8"), date_stamp)
+    k_region = _hmac(k_date, region)
+    k_service = _hmac(k_region, service)
+    return _hmac(k_service, "aws4_request")
+
+
+class Signer:
+    """AWS Signature Version 4 signer for PutMetadata requests.
+    Independent of HTTP client, returns headers to add to a request.
+
+    The derived date/region/service key is cached until the date or the
+    credentials change, and the static parts of the canonical request are
+    built once per (method, url), so per request only the body hash and
+    two HMACs are computed.
+
+    Credentials can be swapped while other threads sign: each request
+    reads the (access key, secret key, token) tuple once, so it's never
+    signed with a mix of old and new credentials"""
+
+    def __init__(self, access_key: str, secret_key: str, session_token: str,
+                 region: str = "us-west-2", service: str = "ivs"):
+        self.region = region
+        self.service = service
+        self.update_credentials(access_key, secret_key, session_token)
+
+    def update_credentials(self, access_key: str, secret_key: str, session_token: str) -> None:
+        """Swaps credentials. Cached parts derived from old credentials are dropped"""
+        # (secret_key, date_stamp, signing_key), single attribute so it's replaced atomically
+        self._signing_key_cache = (None, None, None)
+
+        # (method, url, session_token) -> (canonical request head, canonical request tail, signed headers)
+        self._request_parts = {}
+
+        self.credentials = (access_key, secret_key, session_token)
+
+    @property
+    def access_key(self) -> str:
+        return self.credentials[0]
+
+    def get_signing_key(self, secret_key: str, date_stamp: str) -> bytes:
+        cached_secret_key, cached_date_stamp, signing_key = self._signing_key_cache
+        if cached_date_stamp != date_stamp or cached_secret_key != secret_key:
+            signing_key = derive_signing_key(secret_key, date_stamp, self.region, self.service)
+            self._signing_key_cache = (secret_key, date_stamp, signing_key)
+        return signing_key
+
+    def _get_request_parts(self, method: str, url: str, session_token: str) -> tuple:
+        """Canonical request split around its only variable header (x-amz-date)"""
+        parts = self._request_parts.get((method, url, session_token))
+        if parts is None:
+            url_parts = urlsplit(url)
+            canonical_uri = url_parts.path or "/"
+
+            # Signed headers must be sorted by name
+            signed_headers = "host;x-amz-date"
+            token_header = ""
+            if session_token:
+                signed_headers += ";x-amz-security-token"
+                token_header = f"x-amz-security-token:{session_token}\n"
+
+            head = f"{method}\n{canonical_uri}\n{url_parts.query}\nhost:{url_parts.netloc}\nx-amz-date:"
+            tail = f"\n{token_header}\n{signed_headers}\n"
+            parts = (head, tail, signed_headers)
+            self._request_parts[(method, url, session_token)] = parts
+        return parts
+
+    def sign(self, method: str, url: str, body: bytes, now: datetime = None) -> dict:
+        if now is None:
+            amz_date = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+        else:
+            amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        date_stamp = amz_date[:8]
+
+        access_key, secret_key, session_token = self.credentials
+        head, tail, signed_headers = self._get_request_parts(method, url, session_token)
+        payload_hash = hashlib.sha256(body).hexdigest()
+        canonical_request = f"{head}{amz_date}{tail}{payload_hash}"
+
+        credential_scope = f"{date_stamp}/{self.region}/{self.service}/aws4_request"
+        string_to_sign = (f"{ALGORITHM}\n{amz_date}\n{credential_scope}\n"
+                          f"{hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()}")
+
+        signing_key = self.get_signing_key(secret_key, date_stamp)
+        signature = hmac.new(signing_key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+
+        headers = {
+            "Authorization": (f"{ALGORITHM} Credential={access_key}/{credential_scope}, "
+                              f"SignedHeaders={signed_headers}, Signature={signature}"),
+            "x-amz-date": amz_date,
+            "x-amz-content-sha256": payload_hash,
+        }
+        if session_token:
+            headers["x-amz-security-token"] = session_token
+        return headers
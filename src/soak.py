@@ -0,0 +1,188 @@
+"""Soak mode: keeps memory flat during multi-day runs.
+
+Per-send success lines are not logged (warnings still are); instead the run's
+counters are aggregated into time windows of 'soak_window' seconds. Each closed
+window is logged as one line, kept in a capped in-memory history of 'soak_windows'
+entries and, if 'soak_path' is set, appended to a JSON Lines file. Every window
+line also reports process memory and its growth since the first window, so a leak
+shows up as a steady MB/h figure instead of a crash on Monday morning.
+"""
+import collections
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import data
+
+
+def rss_bytes() -> int or None:
+    """Resident set size of the process. Peak RSS on macOS, where the current one isn't exposed"""
+    try:
+        # Linux
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if sys.platform == "win32":
+        return _windows_rss_bytes()
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _windows_rss_bytes() -> int or None:
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    try:
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+    except (AttributeError, OSError):
+        return None
+    return counters.WorkingSetSize
+
+
+class MemorySample(collections.namedtuple("MemorySample", "time rss_bytes heap_blocks heap_bytes")):
+    """rss_bytes is None if not available; heap_bytes only when tracemalloc is tracing
+    (python -X tracemalloc or PYTHONTRACEMALLOC=1), heap_blocks (CPython allocated blocks) always"""
+
+
+class MemoryTracker:
+    """Samples process memory and reports growth against the first sample
+    (taken at the end of the first window, after imports and connection pools warmed up)"""
+
+    def __init__(self):
+        self.first = None
+
+    def sample(self) -> MemorySample:
+        heap_bytes = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        sample = MemorySample(time.monotonic(), rss_bytes(), sys.getallocatedblocks(), heap_bytes)
+        if self.first is None:
+            self.first = sample
+        return sample
+
+    def growth_note(self, sample: MemorySample) -> str:
+        first = self.first
+        hours = (sample.time - first.time) / 3600
+        parts = []
+        if sample.rss_bytes is not None:
+            parts.append(f"RSS {sample.rss_bytes / 1e6:.1f} MB" +
+                         self._growth(sample.rss_bytes - first.rss_bytes, hours, 1e6, "MB"))
+        if sample.heap_bytes is not None:
+            parts.append(f"heap {sample.heap_bytes / 1e6:.1f} MB" +
+                         self._growth(sample.heap_bytes - first.heap_bytes, hours, 1e6, "MB"))
+        parts.append(f"heap blocks {sample.heap_blocks}" +
+                     self._growth(sample.heap_blocks - first.heap_blocks, hours, 1, "", 0))
+        return ", ".join(parts)
+
+    @staticmethod
+    def _growth(difference: float, hours: float, scale: float, unit: str, digits: int = 1) -> str:
+        if not hours:
+            return ""
+        unit = f" {unit}" if unit else ""
+        return (f" ({difference / scale:+.{digits}f}{unit}, "
+                f"{difference / scale / hours:+.{digits}f}{unit}/h)")
+
+
+class SoakMonitor:
+    """Background thread closing a counters window every 'soak_window' seconds"""
+
+    def __init__(self, window, settings: data.AppSettings):
+        self.window = window
+        self.interval = settings.soak_window
+        self.windows = collections.deque(maxlen=settings.soak_windows)
+        self.path = settings.get_settings_path(os.path.expanduser(settings.soak_path)) if settings.soak_path else ""
+        self.memory = MemoryTracker()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="soak", daemon=True)
+        self.last_metrics = None
+        self.window_start = None
+
+    def start(self) -> "SoakMonitor":
+        self.last_metrics = self.window.metrics.copy()
+        self.window_start = time.time()
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        self.thread.join()
+        # Last, partial window
+        if time.time() - self.window_start >= 1:
+            self.close_window()
+
+    def run(self) -> None:
+        while not self.stop_event.wait(self.interval):
+            self.close_window()
+
+    def close_window(self) -> None:
+        metrics = self.window.metrics.copy()
+        end = time.time()
+        memory_sample = self.memory.sample()
+        record = self.window_record(self.last_metrics, metrics, self.window_start, end, memory_sample)
+        self.last_metrics = metrics
+        self.window_start = end
+
+        self.windows.append(record)
+        if self.path:
+            self.write_record(record)
+        self.window.write_to_log(
+            f"Soak window: sent {record['sent']} ({record['rate_per_sec']:.2f}/s), errors {record['errors']}, "
+            f"latency p50/p99 {record['latency_p50_ms']:.0f}/{record['latency_p99_ms']:.0f} ms; "
+            f"{self.memory.growth_note(memory_sample)}")
+
+    @staticmethod
+    def window_record(earlier, metrics, start: float, end: float, memory_sample: MemorySample) -> dict:
+        """Counters between two SendMetrics snapshots and memory at the end of the window"""
+        latency = metrics.latency.since(earlier.latency)
+        sent = metrics.sent - earlier.sent
+        return {
+            "start": round(start, 3),
+            "seconds": round(end - start, 3),
+            "sent": sent,
+            "rate_per_sec": round(sent / (end - start), 3) if end > start else 0.0,
+            "errors": sum(metrics.errors.values()) - sum(earlier.errors.values()),
+            "statuses": {str(status): count - earlier.statuses.get(status, 0)
+                         for status, count in metrics.statuses.items() if count != earlier.statuses.get(status, 0)},
+            "error_classes": {error_class: count - earlier.errors.get(error_class, 0)
+                              for error_class, count in metrics.errors.items()
+                              if count != earlier.errors.get(error_class, 0)},
+            "latency_p50_ms": round(latency.percentile(50) * 1000, 3),
+            "latency_p99_ms": round(latency.percentile(99) * 1000, 3),
+            "latency_max_ms": round(latency.max * 1000, 3),
+            "rss_bytes": memory_sample.rss_bytes,
+            "heap_bytes": memory_sample.heap_bytes,
+            "heap_blocks": memory_sample.heap_blocks,
+        }
+
+    def write_record(self, record: dict) -> None:
+        # Once per window, so the file isn't held open for days
+        try:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        except OSError as e:
+            self.window.write_to_log(f"{data.WARNING_PREFIX}Soak windows can't be written, file turned off: {e}")
+            self.path = ""
+
+
+def from_settings(window, settings: data.AppSettings) -> SoakMonitor or None:
+    """Returns monitor of a run, None if soak mode is off"""
+    if not settings.soak_mode:
+        return None
+    return SoakMonitor(window, settings)
@@ -0,0 +1,81 @@
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+from urllib3.util.retry import Retry
+
+# time.monotonic when the current thread's request got its pooled connection
+_acquired = threading.local()
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    """Notes when a request got its connection, so waiting for a free one isn't counted as request latency"""
+
+    def _get_conn(self, timeout=None):
+        connection = super()._get_conn(timeout)
+        _acquired.time = time.monotonic()
+        return connection
+
+
+class TimedHTTPSConnectionPool(TimedHTTPConnectionPool, HTTPSConnectionPool):
+    pass
+
+
+class PooledTransport:
+    """Long-lived keep-alive HTTP session with a bounded connection pool.
+    Created once by the send engine and reused across Start/Stop cycles,
+    so consecutive sends don't pay the TCP/TLS handshake again"""
+
+    def __init__(self, pool_size: int = 4, max_retries: int = 2, retry_backoff: float = 0.1):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        # Retry only failures that happen before the request reached the server
+        # (connection errors). Read/status retries are disabled because PutMetadata
+        # is not idempotent - retrying them could insert the same cue twice.
+        retry = Retry(total=max_retries,
+                      connect=max_retries,
+                      read=0,
+                      status=0,
+                      backoff_factor=retry_backoff,
+                      raise_on_status=False)
+
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=pool_size,
+                              max_retries=retry,
+                              pool_block=True)
+        adapter.poolmanager.pool_classes_by_scheme = {"http": TimedHTTPConnectionPool,
+                                                      "https": TimedHTTPSConnectionPool}
+
+        self.session = requests.Session()
+        self.session.headers.update({"Connection": "keep-alive"})
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def matches(self, pool_size: int, max_retries: int, retry_backoff: float) -> bool:
+        """Checks if transport was created with given pool/retry configuration"""
+        return (self.pool_size, self.max_retries, self.retry_backoff) == (pool_size, max_retries, retry_backoff)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        _acquired.time = None
+        return self.session.post(url, **kwargs)
+
+    @staticmethod
+    def acquired_time(default: float) -> float:
+        """time.monotonic when the last post() of this thread got its connection, default if it never got one"""
+        return getattr(_acquired, "time", None) or default
+
+    def close(self) -> None:
+        self.session.close()
+
+
+def get_error_class(error: requests.RequestException) -> str:
+    """Class name of a failed post(). ConnectionError is named after its cause when the connection
+    couldn't be opened, so it can be told apart from one dropped after the request was sent"""
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    if isinstance(error, requests.ConnectionError) and isinstance(reason, NewConnectionError):
+        return type(reason).__name__
+    return type(error).__name__
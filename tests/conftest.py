@@ -0,0 +1,20 @@
+import os
+import sys
+import pytest
+
+# Modules live flat in src/ and import each other by name, as when run with python src/cli.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import data  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def app_settings():
+    """AppSettings is class-level global state: every test gets it back as it found it"""
+    saved = {key: value for key, value in vars(data.AppSettings).items() if not key.startswith("__")}
+    yield data.AppSettings
+    for key in [key for key in vars(data.AppSettings) if not key.startswith("__")]:
+        if key not in saved:
+            delattr(data.AppSettings, key)
+    for key, value in saved.items():
+        setattr(data.AppSettings, key, value)
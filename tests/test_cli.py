@@ -0,0 +1,92 @@
+"""End-to-end headless runs of cli.py against mock_ivs.py, no AWS account needed"""
+import datetime
+import json
+import signal
+import pytest
+import cli
+import data
+import mock_ivs
+
+CHANNELS = {
+    "A": "arn:aws:ivs:us-west-2:123456789012:channel/A",
+    "B": "arn:aws:ivs:us-west-2:123456789012:channel/B",
+}
+
+
+@pytest.fixture
+def mock_server():
+    server = mock_ivs.MockIVSServer(("127.0.0.1", 0), mock_ivs.MockConfig()).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def settings_dir(tmp_path, monkeypatch):
+    """settings.json of the run in a temp dir, so the one next to the sources is never read or written"""
+    (tmp_path / "settings.json").write_text(json.dumps({"schema_version": data.SETTINGS_SCHEMA_VERSION,
+                                                        "arns": CHANNELS, "wait": 1}))
+    monkeypatch.setattr(data.AppSettings, "get_settings_path",
+                        classmethod(lambda cls, filename="settings.json": str(tmp_path / filename)))
+    # cli.main installs its own Ctrl+C / kill handlers
+    handlers = {signum: signal.getsignal(signum) for signum in (signal.SIGINT, signal.SIGTERM)}
+    yield tmp_path
+    for signum, handler in handlers.items():
+        signal.signal(signum, handler)
+
+
+@pytest.fixture
+def credentials_file(tmp_path):
+    expiration = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
+    path = tmp_path / "credentials.json"
+    path.write_text(json.dumps({"Version": 1, "AccessKeyId": "AKIDEXAMPLE", "SecretAccessKey": "secret",
+                                "SessionToken": "token",
+                                "Expiration": expiration.isoformat().replace("+00:00", "Z")}))
+    return path
+
+
+def run(mock_server, credentials_file, *args) -> int:
+    return cli.main(["--endpoint-url", mock_server.url, "--credential-source", f"file:{credentials_file}",
+                     "--rate", "20", *args])
+
+
+def test_run_sends_count_messages(mock_server, settings_dir, credentials_file, capsys):
+    metrics_path = settings_dir / "metrics.json"
+    journal_path = settings_dir / "journal.jsonl"
+    assert run(mock_server, credentials_file, "--channel", "B", "--count", "5",
+               "--metrics-out", str(metrics_path), "--journal", str(journal_path)) == 0
+
+    received = mock_server.stats()["received"]
+    assert [(arn, metadata) for _, arn, metadata in received] == [
+        (CHANNELS["B"], f"testMetadata_{index}") for index in range(1, 6)]
+    # 20 msg/s: 5 sends take 4 intervals
+    assert received[-1][0] - received[0][0] == pytest.approx(0.2, abs=0.1)
+
+    exported = json.loads(metrics_path.read_text())
+    assert exported["sent"] == 5
+    assert exported["failures"] == 0
+    assert exported["statuses"] == {"204": 5}
+    with open(journal_path, encoding="utf-8") as file:
+        assert [json.loads(line)["index"] for line in file] == [1, 2, 3, 4, 5]
+    assert "Sent: 5" in capsys.readouterr().out
+
+
+def test_run_on_all_channels_with_template(mock_server, settings_dir, credentials_file):
+    assert run(mock_server, credentials_file, "--all-channels", "--count", "3",
+               "--message", '{"ch":"${channel}","i":${index}}', "--index", "10") == 0
+    received = sorted((arn, json.loads(metadata)["i"], json.loads(metadata)["ch"])
+                      for _, arn, metadata in mock_server.stats()["received"])
+    assert received == [(CHANNELS[name], index, name) for name in CHANNELS for index in (10, 11, 12)]
+
+
+def test_final_failures_fail_the_run(mock_server, settings_dir, credentials_file):
+    mock_server.config.offline_channels.add(CHANNELS["A"])
+    assert run(mock_server, credentials_file, "--channel", "A", "--count", "5") == 1
+    # ChannelNotBroadcasting is not retried, the final error ends the run
+    assert mock_server.stats()["responses"] == {404: 1}
+
+
+def test_invalid_arguments(settings_dir, capsys):
+    assert cli.main(["--channel", "nope"]) == 2
+    assert "Unknown channel: nope" in capsys.readouterr().err
+    assert cli.main(["--schedule", "sine"]) == 2
@@ -0,0 +1,70 @@
+import queue
+import threading
+import pytest
+import cli
+import control
+import data
+
+CHANNELS = {"A": "arn:aws:ivs:us-west-2:123456789012:channel/A",
+            "B": "arn:aws:ivs:us-west-2:123456789012:channel/B"}
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    monkeypatch.setattr(data.AppSettings, "arns", dict(CHANNELS))
+    return control.Controller(cli.ConsoleWindow("A", False), data.AppSettings)
+
+
+def call_from_thread(call, function, *args):
+    outcome = []
+    thread = threading.Thread(target=lambda: outcome.append(call(function, *args)))
+    thread.start()
+    return thread, outcome
+
+
+def test_queued_caller_runs_function_where_queue_is_drained():
+    call_queue = queue.Queue()
+    call = control.queued_caller(call_queue)
+    thread, outcome = call_from_thread(call, lambda x: (x, threading.current_thread()), 7)
+    # Nothing runs until the owner of the queue takes the call off it
+    call_queue.get(timeout=5)()
+    thread.join(5)
+    assert outcome == [(7, threading.main_thread())]
+
+
+def test_queued_caller_raises_error_of_function():
+    call_queue = queue.Queue()
+    call = control.queued_caller(call_queue)
+    errors = []
+
+    def fail():
+        raise control.ControlError("Unknown channel: C")
+
+    def run():
+        try:
+            call(fail)
+        except control.ControlError as e:
+            errors.append(str(e))
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    call_queue.get(timeout=5)()
+    thread.join(5)
+    assert errors == ["Unknown channel: C"]
+
+
+def test_queued_caller_runs_main_thread_calls_directly():
+    call_queue = queue.Queue()
+    assert control.queued_caller(call_queue)(lambda: 5) == 5
+    assert call_queue.empty()
+
+
+def test_channel_selection_shows_in_status(controller):
+    assert controller.status()["channel"] == "A"
+    assert not controller.status()["all_channels"]
+    status = controller.channel({"channel": "B"})
+    assert (status["channel"], status["all_channels"]) == ("B", False)
+    status = controller.channel({"all_channels": True})
+    assert (status["channel"], status["all_channels"]) == ("B", True)
+    with pytest.raises(control.ControlError, match="Unknown channel"):
+        controller.channel({"channel": "C"})
@@ -0,0 +1,30 @@
+import json
+import data
+
+
+def write_settings(tmp_path, monkeypatch, settings_dict: dict) -> None:
+    (tmp_path / "settings.json").write_text(json.dumps(settings_dict))
+    monkeypatch.setattr(data.AppSettings, "get_settings_path",
+                        classmethod(lambda cls, filename="settings.json": str(tmp_path / filename)))
+
+
+def test_saved_settings_are_read(tmp_path, monkeypatch):
+    write_settings(tmp_path, monkeypatch, {"schema_version": data.SETTINGS_SCHEMA_VERSION, "wait": 0.5,
+                                           "arns": {"A": "arn"}, "unknown_key": 1})
+    data.AppSettings.from_file()
+    assert data.AppSettings.wait == 0.5
+    assert data.AppSettings.arns == {"A": "arn"}
+    assert not hasattr(data.AppSettings, "unknown_key")
+
+
+def test_old_rate_limit_default_becomes_account_limit(tmp_path, monkeypatch):
+    write_settings(tmp_path, monkeypatch, {"schema_version": 1, "rate_limit_tps": 5.0})
+    data.AppSettings.from_file()
+    assert data.AppSettings.rate_limit_tps == 155.0
+    assert data.AppSettings.channel_rate_limit_tps == 5.0
+
+
+def test_changed_rate_limit_is_kept(tmp_path, monkeypatch):
+    write_settings(tmp_path, monkeypatch, {"rate_limit_tps": 50.0})
+    data.AppSettings.from_file()
+    assert data.AppSettings.rate_limit_tps == 50.0
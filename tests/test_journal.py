@@ -0,0 +1,126 @@
+import json
+import os
+import threading
+import time
+import journal
+from data import SendResult
+
+
+def record(send_journal: journal.SendJournal, index: int, result: SendResult = None) -> None:
+    send_journal.record("A", "arn:aws:ivs:us-west-2:123456789012:channel/A", index, f"m_{index}",
+                        10.0 + index, 1_700_000_000.0 + index, 10.05 + index, result or SendResult(f"m_{index}", 204))
+
+
+def read_lines(path) -> list:
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file]
+
+
+def read_record_line(tmp_path) -> str:
+    """One journal line as written by record(), to size rotation limits in whole records"""
+    path = tmp_path / "sample.jsonl"
+    send_journal = journal.SendJournal(str(path))
+    record(send_journal, 10)
+    send_journal.close()
+    with open(path, encoding="utf-8") as file:
+        line = file.read()
+    os.remove(path)
+    return line
+
+
+def test_record_fields(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    send_journal = journal.SendJournal(str(path))
+    record(send_journal, 1)
+    record(send_journal, 2, SendResult("Rate exceeded", 429, "ThrottlingException"))
+    record(send_journal, 3, SendResult("ReadTimeout: read timed out", None, "ReadTimeout"))
+    send_journal.close()
+
+    first, second, third = read_lines(path)
+    assert first == {"index": 1, "channel": "A", "arn": "arn:aws:ivs:us-west-2:123456789012:channel/A",
+                     "metadata": "m_1", "request_mono": 11.0, "request_wall": 1_700_000_001.0,
+                     "response_mono": 11.05, "status": 204, "error_class": None, "category": None, "maybe_delivered": False,
+                     "error": None}
+    assert second["category"] == "throttle"
+    assert second["error"] == "Rate exceeded"
+    assert not second["maybe_delivered"]
+    assert (third["category"], third["maybe_delivered"]) == ("network", True)
+
+
+def test_counted_size_matches_file(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    send_journal = journal.SendJournal(str(path), max_bytes=1_000_000, fsync_interval=3600)
+    for index in range(50):
+        record(send_journal, index)
+    # Records stay in the userspace buffer: size is counted, not read from the file
+    assert os.path.getsize(path) == 0
+    assert send_journal.records == 50
+    send_journal.close()
+    assert send_journal.size == os.path.getsize(path)
+
+
+def test_size_counts_utf8_bytes(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    send_journal = journal.SendJournal(str(path), max_bytes=1_000_000)
+    send_journal.record("Ä", "arn", 1, "é" * 10, 0.0, 0.0, 0.0, SendResult("é" * 10, 204))
+    send_journal.close()
+    assert send_journal.size == os.path.getsize(path)
+
+
+def test_reopened_journal_continues_size(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    send_journal = journal.SendJournal(str(path), max_bytes=1_000_000)
+    record(send_journal, 1)
+    send_journal.close()
+    reopened = journal.SendJournal(str(path), max_bytes=1_000_000)
+    assert reopened.size == os.path.getsize(path)
+    reopened.close()
+
+
+def test_rotation(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    line_size = len(read_record_line(tmp_path).encode("utf-8"))
+    # Three records per file
+    send_journal = journal.SendJournal(str(path), max_bytes=line_size * 3, backups=2)
+    for index in range(10, 21):
+        record(send_journal, index)
+    send_journal.close()
+
+    assert [line["index"] for line in read_lines(f"{path}.2")] == [13, 14, 15]
+    assert [line["index"] for line in read_lines(f"{path}.1")] == [16, 17, 18]
+    assert [line["index"] for line in read_lines(path)] == [19, 20]
+    # Oldest file was dropped
+    assert not os.path.exists(f"{path}.3")
+    assert send_journal.size == os.path.getsize(path)
+
+
+def test_rotation_without_backups(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    send_journal = journal.SendJournal(str(path), max_bytes=1, backups=0)
+    record(send_journal, 1)
+    record(send_journal, 2)
+    send_journal.close()
+    assert os.listdir(tmp_path) == ["journal.jsonl"]
+    assert os.path.getsize(path) == 0
+
+
+def test_fsync_runs_off_the_send_path(tmp_path, monkeypatch):
+    synced_by = []
+    real_fsync = os.fsync
+
+    def fsync(descriptor):
+        synced_by.append(threading.current_thread().name)
+        real_fsync(descriptor)
+
+    monkeypatch.setattr(journal.os, "fsync", fsync)
+    path = tmp_path / "journal.jsonl"
+    send_journal = journal.SendJournal(str(path), fsync_interval=0.2)
+    record(send_journal, 1)
+    assert synced_by == []
+    # Records reach the disk without another record or close()
+    deadline = time.monotonic() + 5
+    while not synced_by and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert synced_by == ["journal-sync"]
+    assert [line["index"] for line in read_lines(path)] == [1]
+    send_journal.close()
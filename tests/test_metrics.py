@@ -0,0 +1,88 @@
+import csv
+import json
+import pytest
+import metrics
+
+# Upper bound of a bucket is at most one bucket width (10 ** (1 / 20), ~12%) above its values
+BUCKET_WIDTH = 10 ** (1 / 20)
+
+
+def latencies(values_ms) -> metrics.LogHistogram:
+    histogram = metrics.LogHistogram()
+    for value in values_ms:
+        histogram.record(value / 1000)
+    return histogram
+
+
+def test_empty_histogram():
+    histogram = metrics.LogHistogram()
+    assert histogram.percentile(50) == 0.0
+    assert histogram.mean() == 0.0
+
+
+@pytest.mark.parametrize("p, exact_ms", [(50, 50), (90, 90), (95, 95), (99, 99)])
+def test_percentiles_within_bucket_resolution(p, exact_ms):
+    histogram = latencies(range(1, 101))
+    assert exact_ms / 1000 <= histogram.percentile(p) <= exact_ms / 1000 * BUCKET_WIDTH
+
+
+def test_percentile_never_above_max():
+    histogram = latencies([10] * 99 + [20])
+    assert histogram.percentile(100) == pytest.approx(0.02)
+    assert 0.01 <= histogram.percentile(50) <= 0.01 * BUCKET_WIDTH
+    assert histogram.max == pytest.approx(0.02)
+    assert histogram.mean() == pytest.approx(0.0101)
+
+
+def test_values_outside_range():
+    histogram = metrics.LogHistogram(min_value=1e-3, max_value=1.0)
+    histogram.record(1e-5)
+    histogram.record(50.0)
+    assert histogram.counts[0] == 1
+    assert histogram.counts[-1] == 1
+    # Underflow bucket reports min_value
+    assert histogram.percentile(50) == pytest.approx(1e-3)
+    assert histogram.max == 50.0
+
+
+def test_since():
+    histogram = latencies([1] * 10)
+    earlier = histogram.copy()
+    for value in [100] * 5:
+        histogram.record(value / 1000)
+    window = histogram.since(earlier)
+    assert window.count == 5
+    assert 0.1 <= window.percentile(50) <= 0.1 * BUCKET_WIDTH
+    # The copy is independent of the histogram it was taken from
+    assert earlier.count == 10
+    assert sum(earlier.counts) == 10
+
+
+def test_send_metrics_counts_and_export(tmp_path):
+    send_metrics = metrics.SendMetrics()
+    send_metrics.record_send(0.05, 204)
+    send_metrics.record_send(0.08, 429, "ThrottlingException")
+    send_metrics.record_send(0.07, 204)
+    send_metrics.record_send(1.0, None, "ReadTimeout")
+    send_metrics.record_failure()
+
+    snapshot = send_metrics.peek()
+    assert snapshot.sent == 4
+    assert snapshot.failures == 1
+    assert snapshot.statuses == {204: 2, 429: 1, None: 1}
+    assert snapshot.errors == {"ThrottlingException": 1, "ReadTimeout": 1}
+
+    json_path = tmp_path / "metrics.json"
+    send_metrics.export(str(json_path))
+    exported = json.loads(json_path.read_text())
+    assert exported["sent"] == 4
+    assert exported["failures"] == 1
+    assert exported["latency"]["count"] == 4
+    assert exported["statuses"] == {"204": 2, "429": 1, "None": 1}
+
+    csv_path = tmp_path / "metrics.csv"
+    send_metrics.export(str(csv_path))
+    rows = list(csv.reader(csv_path.open()))
+    assert rows[0] == ["section", "key", "value"]
+    assert ["run", "failures", "1"] in rows
+    assert ["errors", "ThrottlingException", "1"] in rows
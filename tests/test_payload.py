@@ -0,0 +1,102 @@
+import json
+import pytest
+import payload
+
+
+def test_legacy_message_gets_index_appended():
+    template = payload.BodyTemplate("arn:aws:ivs:us-west-2:123456789012:channel/A", "testMetadata")
+    body, metadata = template.render(7)
+    assert metadata == "testMetadata_7"
+    assert json.loads(body) == {"channelArn": "arn:aws:ivs:us-west-2:123456789012:channel/A",
+                                "metadata": "testMetadata_7"}
+
+
+def test_template_placeholders_and_escaping():
+    template = payload.BodyTemplate("arn", '{"ch":"${channel}","i":${index},"r":"${rand}","p":"100% $$"}', "A")
+    body, metadata = template.render(42)
+    event = json.loads(metadata)
+    assert event["ch"] == "A"
+    assert event["i"] == 42
+    assert len(event["r"]) == 8
+    assert event["p"] == "100% $"
+    # Body is valid JSON carrying the metadata as a string
+    assert json.loads(body)["metadata"] == metadata
+
+
+def test_given_metadata_is_sent_as_is():
+    template = payload.BodyTemplate("arn", "m")
+    body, metadata = template.render(1, 'replayed "cue"')
+    assert metadata == 'replayed "cue"'
+    assert json.loads(body)["metadata"] == 'replayed "cue"'
+
+
+def test_unknown_placeholder():
+    with pytest.raises(payload.TemplateError, match="Unknown template placeholder"):
+        payload.validate_template("${nope}")
+
+
+def test_validate_template_limit():
+    # Literal text plus widest rendered index (12 digits) must fit into 1 KB
+    payload.validate_template("x" * (payload.METADATA_MAX_BYTES - 12) + "${index}")
+    with pytest.raises(payload.TemplateError, match="IVS limit"):
+        payload.validate_template("x" * (payload.METADATA_MAX_BYTES - 11) + "${index}")
+    # Multibyte characters count as bytes, not characters
+    with pytest.raises(payload.TemplateError, match="IVS limit"):
+        payload.validate_template("é" * 600)
+
+
+def test_validate_template_checks_channel_names():
+    payload.validate_template("x" * 1000 + "${channel}", ("A",))
+    with pytest.raises(payload.TemplateError):
+        payload.validate_template("x" * 1000 + "${channel}", ("A", "B" * 100))
+
+
+def test_validate_template_json():
+    payload.validate_template('{"i": ${index}, "t": ${wall_ms}}')
+    with pytest.raises(payload.TemplateError, match="not valid JSON"):
+        payload.validate_template('{"i": ${index}')
+
+
+def test_validate_packed_template_counts_escaped_literals():
+    # 500 quotes are 500 bytes plain, 1000 bytes as a JSON string inside a packed payload
+    payload.validate_template('"' * 500)
+    with pytest.raises(payload.TemplateError):
+        payload.validate_template('"' * 500, packed=True)
+
+
+def test_pack_unpack_round_trip():
+    template = payload.PackedBodyTemplate("arn", "cue-${index}", rate=10.0, first_index=5)
+    first = template.pack(100.0)
+    assert payload.unpack(first) == [(5, template.start_wall_ms, "cue-5")]
+
+    # 0.35 s later events 6, 7 and 8 were generated, 100 ms apart
+    second = template.pack(100.35)
+    assert payload.unpack(second) == [(6, template.start_wall_ms + 100, "cue-6"),
+                                      (7, template.start_wall_ms + 200, "cue-7"),
+                                      (8, template.start_wall_ms + 300, "cue-8")]
+
+
+def test_packed_payload_stays_within_limit():
+    template = payload.PackedBodyTemplate("arn", "x" * 100 + "${index}", rate=1000.0, first_index=1)
+    template.pack(0.0)
+    # 1000 events are waiting, each payload carries as many as fit and the rest follow
+    sent = []
+    for _ in range(200):
+        metadata = template.pack(1.0)
+        assert len(metadata.encode("utf-8")) <= payload.METADATA_MAX_BYTES
+        sent += [index for index, _, _ in payload.unpack(metadata)]
+        if sent[-1] >= 1000:
+            break
+    assert sent == list(range(2, len(sent) + 2))
+
+
+def test_packed_render_is_repeated_for_retries():
+    template = payload.PackedBodyTemplate("arn", "cue", rate=100.0)
+    assert template.render(1) is template.render(1)
+    body, metadata = template.render(1)
+    assert json.loads(body)["metadata"] == metadata
+
+
+def test_unpack_of_unpacked_metadata():
+    assert payload.unpack("testMetadata_1") is None
+    assert payload.unpack('{"pack":1,"i":1}') is None
@@ -0,0 +1,96 @@
+import threading
+import types
+import pytest
+import ratelimit
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = types.SimpleNamespace(now=500.0)
+    monkeypatch.setattr(ratelimit, "time", types.SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_burst_then_rate(clock):
+    bucket = ratelimit.TokenBucket(rate=5, burst=3)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    # Later callers queue behind each other, one token every 1 / rate seconds
+    assert [bucket.reserve() for _ in range(3)] == pytest.approx([0.2, 0.4, 0.6])
+
+
+def test_refill_is_capped_at_burst(clock):
+    bucket = ratelimit.TokenBucket(rate=10, burst=2)
+    bucket.reserve()
+    bucket.reserve()
+    clock.now += 60
+    assert [bucket.try_acquire() for _ in range(3)] == [True, True, False]
+    clock.now += 0.1
+    assert bucket.try_acquire()
+
+
+def test_burst_is_at_least_one(clock):
+    bucket = ratelimit.TokenBucket(rate=2, burst=0)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.5)
+
+
+def test_acquire_waits_on_stop_event(clock):
+    bucket = ratelimit.TokenBucket(rate=1)
+    waits = []
+
+    class Event:
+        def wait(self, timeout):
+            waits.append(timeout)
+            return False
+
+        def is_set(self):
+            return False
+
+    assert bucket.acquire(Event())
+    assert waits == []
+    assert bucket.acquire(Event())
+    assert waits == pytest.approx([1.0])
+
+
+def test_acquire_returns_false_when_stopped(clock):
+    stop_event = threading.Event()
+    stop_event.set()
+    bucket = ratelimit.TokenBucket(rate=1)
+    # Token is free but the run is stopped, also while waiting for the next one
+    assert not bucket.acquire(stop_event)
+    assert not bucket.acquire(stop_event)
+
+
+def test_channel_bucket_takes_account_token_too(clock):
+    account = ratelimit.TokenBucket(rate=4, burst=2)
+    first = ratelimit.TokenBucket(rate=10, burst=10, parent=account)
+    second = ratelimit.TokenBucket(rate=10, burst=10, parent=account)
+    assert first.reserve() == 0.0
+    assert second.reserve() == 0.0
+    # Both channels have tokens left, the account doesn't
+    assert first.reserve() == pytest.approx(0.25)
+    assert second.reserve() == pytest.approx(0.5)
+
+
+def test_from_settings_limits_each_channel(clock):
+    settings = types.SimpleNamespace(rate_limit_tps=155.0, channel_rate_limit_tps=5.0)
+    buckets = ratelimit.from_settings(settings, ["arn1", "arn2", "arn3"])
+    # Channels don't share their per-channel limit: 5 per second each, 15 together
+    delays = [[buckets[arn].reserve() for _ in range(10)] for arn in buckets]
+    for channel_delays in delays:
+        assert channel_delays[:5] == [0.0] * 5
+        assert channel_delays[5:] == pytest.approx([0.2, 0.4, 0.6, 0.8, 1.0])
+    assert len({id(bucket.parent) for bucket in buckets.values()}) == 1
+
+
+@pytest.mark.parametrize("rate", [0, 0.0, -1])
+def test_zero_rate_is_unlimited(clock, rate):
+    bucket = ratelimit.TokenBucket(rate, rate)
+    assert [bucket.reserve() for _ in range(100)] == [0.0] * 100
+    assert bucket.try_acquire()
+
+
+def test_unlimited_channel_still_takes_account_token(clock):
+    settings = types.SimpleNamespace(rate_limit_tps=2.0, channel_rate_limit_tps=0)
+    bucket = ratelimit.from_settings(settings, ["arn"])["arn"]
+    assert [bucket.reserve() for _ in range(3)] == pytest.approx([0.0, 0.0, 0.5])
@@ -0,0 +1,85 @@
+import pytest
+import ratecontrol
+import responses
+from data import SendResult
+
+
+@pytest.mark.parametrize("status, headers, error_class", [
+    (429, {"x-amzn-ErrorType": "ThrottlingException:http://internal.amazon.com/coral/"}, "ThrottlingException"),
+    (400, {"x-amzn-ErrorType": "ValidationException"}, "ValidationException"),
+    (502, {}, "HTTP 502"),
+])
+def test_get_error_class(status, headers, error_class):
+    assert responses.get_error_class(status, headers) == error_class
+
+
+@pytest.mark.parametrize("status, error_class, category", [
+    (429, "ThrottlingException", responses.THROTTLE),
+    (400, "TooManyRequestsException", responses.THROTTLE),
+    (400, "ValidationException", responses.VALIDATION),
+    (403, "ExpiredTokenException", responses.AUTH),
+    # 404 of an offline channel, told apart from an unknown one by its error type
+    (404, "ChannelNotBroadcasting", responses.CHANNEL_NOT_LIVE),
+    (404, "ResourceNotFoundException", responses.NOT_FOUND),
+    (500, "InternalServerException", responses.SERVER),
+    # Error type header missing: status decides
+    (503, "HTTP 503", responses.SERVER),
+    (429, "HTTP 429", responses.THROTTLE),
+    (401, "HTTP 401", responses.AUTH),
+    (418, "HTTP 418", responses.OTHER),
+    (None, "ConnectionError", responses.NETWORK),
+])
+def test_classify(status, error_class, category):
+    assert responses.classify(status, error_class) == category
+    assert SendResult("error", status, error_class).category == category
+
+
+@pytest.mark.parametrize("result, maybe_delivered", [
+    (SendResult("ReadTimeout: read timed out", None, "ReadTimeout"), True),
+    (SendResult("NewConnectionError: refused", None, "NewConnectionError"), False),
+    (SendResult("Internal error", 500, "InternalServerException"), False),
+    (SendResult("m_1", 204), False),
+])
+def test_maybe_delivered(result, maybe_delivered):
+    assert result.maybe_delivered == maybe_delivered
+
+
+def test_success_has_no_category():
+    assert responses.is_success(204)
+    assert not responses.is_success(429)
+    assert SendResult("m_1", 204).category is None
+
+
+@pytest.mark.parametrize("status, error_class, kind", [
+    (429, "ThrottlingException", ratecontrol.THROTTLE),
+    (500, "InternalServerException", ratecontrol.TRANSIENT),
+    # Never sent: safe to send again
+    (None, "ConnectTimeout", ratecontrol.TRANSIENT),
+    (None, "NewConnectionError", ratecontrol.TRANSIENT),
+    (None, "ClientConnectorError", ratecontrol.TRANSIENT),
+    # May have been delivered: a retry could insert the metadata twice
+    (None, "ReadTimeout", ratecontrol.PERMANENT),
+    (None, "ConnectionError", ratecontrol.PERMANENT),
+    (None, "ServerDisconnectedError", ratecontrol.PERMANENT),
+    (None, "TimeoutError", ratecontrol.PERMANENT),
+    (400, "ValidationException", ratecontrol.PERMANENT),
+    (404, "ChannelNotBroadcasting", ratecontrol.PERMANENT),
+])
+def test_retry_kind(status, error_class, kind):
+    assert ratecontrol.classify_failure(status, error_class) == kind
+
+
+@pytest.mark.parametrize("body, message", [
+    (b'{"message": "Rate exceeded\\nsecond line"}', "Rate exceeded"),
+    (b'{"Message": "Channel is offline"}', "Channel is offline"),
+    (b'{"MESSAGE": "odd spelling"}', "odd spelling"),
+    (b'{"other": 1}', "No message found in the response."),
+    (b'[1, 2]', "No message found in the response."),
+    (b"", "No message found in the response."),
+])
+def test_get_error_message(body, message):
+    assert responses.get_error_message(body) == message
+
+
+def test_get_error_message_of_broken_json():
+    assert responses.get_error_message(b"<html>").startswith("Error decoding response JSON")
@@ -0,0 +1,197 @@
+import random
+import types
+import pytest
+import ratecontrol
+import scheduler
+import schedules
+from data import SendResult
+
+
+class FakeClock:
+    """time.monotonic of the scheduler module; waiting on it moves the clock instead of sleeping"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    # threading.Event interface used by Scheduler.wait_next
+    def wait(self, timeout: float) -> bool:
+        self.now += timeout
+        return False
+
+    def is_set(self) -> bool:
+        return False
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def ticks(schedule: scheduler.Scheduler, clock: FakeClock, count: int) -> list:
+    """Send times of the next count ticks relative to the start of the schedule"""
+    times = []
+    for _ in range(count):
+        if not schedule.wait_next():
+            break
+        times.append(round(clock.now - schedule.start, 6))
+    return times
+
+
+def take(pattern, count: int) -> list:
+    return [round(offset, 6) for offset, _ in (next(pattern) for _ in range(count))]
+
+
+def test_constant_ticks_on_absolute_deadlines(clock):
+    schedule = scheduler.Scheduler(0.5, clock)
+    assert schedule.wait_next()
+    # A slow request doesn't push later ticks back
+    clock.now += 0.3
+    assert ticks(schedule, clock, 3) == [0.5, 1.0, 1.5]
+    assert schedule.tick == 4
+
+
+def test_late_tick_is_sent_at_once_and_reported(clock):
+    schedule = scheduler.Scheduler(0.5, clock)
+    schedule.wait_next()
+    clock.now += 0.7
+    assert schedule.wait_next()
+    assert schedule.lateness == pytest.approx(0.2)
+    assert schedule.lateness_note() == " (late 200 ms)"
+    assert ticks(schedule, clock, 1) == [1.0]
+
+
+def test_max_ticks(clock):
+    schedule = scheduler.Scheduler(0.1, clock, max_ticks=3)
+    assert ticks(schedule, clock, 10) == [0.0, 0.1, 0.2]
+
+
+def test_max_duration(clock):
+    schedule = scheduler.Scheduler(0.25, clock, max_duration=1.0)
+    assert ticks(schedule, clock, 10) == [0.0, 0.25, 0.5, 0.75]
+
+
+def test_max_duration_counts_elapsed_time(clock):
+    # Sends held back (rate limit, retry backoff) must not stretch the run past its duration
+    schedule = scheduler.Scheduler(0.25, clock, max_duration=1.0)
+    assert ticks(schedule, clock, 2) == [0.0, 0.25]
+    clock.now += 1.0
+    assert schedule.next_deadline() is None
+
+
+def test_set_interval_re_anchors_at_last_tick(clock):
+    schedule = scheduler.Scheduler(1.0, clock)
+    assert ticks(schedule, clock, 2) == [0.0, 1.0]
+    schedule.set_interval(0.5)
+    assert ticks(schedule, clock, 3) == [1.5, 2.0, 2.5]
+
+
+def test_set_interval_skips_missed_ticks(clock):
+    schedule = scheduler.Scheduler(1.0, clock)
+    assert ticks(schedule, clock, 1) == [0.0]
+    clock.now += 3.0
+    # Rate raised long after the last tick: the next one is sent right away, the missed ones aren't
+    # caught up in a burst, later ticks follow at the new interval
+    schedule.set_interval(0.5)
+    assert schedule.next_deadline() == pytest.approx(clock.now)
+    assert ticks(schedule, clock, 2) == [3.0, 3.5]
+
+
+def test_skip_missed_after_retry(clock):
+    schedule = scheduler.Scheduler(0.1, clock)
+    assert ticks(schedule, clock, 2) == [0.0, 0.1]
+    # The last tick was retried for a second; the ticks missed meanwhile are not caught up
+    clock.now += 1.0
+    schedule.skip_missed()
+    assert ticks(schedule, clock, 3) == [1.2, 1.3, 1.4]
+
+
+def test_retried_send_does_not_burst(clock):
+    schedule = scheduler.Scheduler(0.1, clock)
+    controller = ratecontrol.RateController(0.1, max_retries=2, backoff_base=0.5, backoff_max=10.0,
+                                            throttle_slowdown=2.0, recovery_speedup=1.1)
+    assert ticks(schedule, clock, 1) == [0.0]
+    delay = controller.handle(SendResult("Internal error", 500, "InternalServerException"), schedule, 1)
+    assert delay is not None
+    assert controller.attempts == {1: 1}
+    clock.now += 1.0
+    assert controller.handle(SendResult("m_1"), schedule, 1) is None
+    assert controller.attempts == {}
+    assert ticks(schedule, clock, 2) == [1.1, 1.2]
+
+
+def test_attempts_are_counted_per_index(clock):
+    schedule = scheduler.Scheduler(0.1, clock)
+    controller = ratecontrol.RateController(0.1, max_retries=1, backoff_base=0.1, backoff_max=1.0,
+                                            throttle_slowdown=2.0, recovery_speedup=1.1)
+    schedule.wait_next()
+    failure = SendResult("Internal error", 500, "InternalServerException")
+    # In-flight indexes (async engine) each get their own retries
+    assert controller.handle(failure, schedule, 1) is not None
+    assert controller.handle(failure, schedule, 2) is not None
+    assert controller.handle(failure, schedule, 1) is None
+    assert controller.handle(failure, schedule, 2) is None
+
+
+def test_pattern_offsets_follow_rate_change(clock):
+    schedule = scheduler.Scheduler(1.0, clock, pattern=schedules.burst(1.0, 2, 0.1))
+    assert ticks(schedule, clock, 4) == [0.0, 0.1, 1.0, 1.1]
+    # Halved interval halves the gaps of the pattern, burst spacing included
+    schedule.set_interval(0.5)
+    assert ticks(schedule, clock, 2) == [1.55, 1.6]
+
+
+def test_replay_metadata_reaches_ticks(clock, tmp_path):
+    timeline = tmp_path / "timeline.tsv"
+    timeline.write_text("# recorded\n100.0\tfirst\n100.5\t\nbad line\n102.0 last cue\n", encoding="utf-8")
+    schedule = scheduler.Scheduler(1.0, clock, pattern=schedules.create(f"replay:{timeline}", 1.0))
+    sent = []
+    while schedule.wait_next():
+        sent.append((round(clock.now - schedule.start, 6), schedule.metadata))
+    assert sent == [(0.0, "first"), (0.5, None), (2.0, "last cue")]
+
+
+def test_constant_and_burst_patterns():
+    assert take(schedules.create("constant", 0.5), 3) == [0.0, 0.5, 1.0]
+    assert take(schedules.create("burst:size=3,spacing=0.1", 2.0), 6) == [0.0, 0.1, 0.2, 2.0, 2.1, 2.2]
+
+
+def test_ramp_patterns():
+    # 1 msg/s ramping to 3 msg/s over 2 s, then held
+    assert take(schedules.create("linear:from=1,to=3,over=2", 1.0), 4) == [0.0, 1.0, 1.5, 1.9]
+    # Rates 1, 2, 3 msg/s held for 2 s each
+    assert take(schedules.create("step:from=1,to=3,steps=3,every=2", 1.0), 6) == [0.0, 1.0, 2.0, 2.5, 3.0, 3.5]
+
+
+def test_poisson_pattern():
+    offsets = take(schedules.poisson(10.0, random.Random(1)), 2001)
+    assert offsets == sorted(offsets)
+    # Mean gap of 10 msg/s arrivals is 0.1 s
+    assert offsets[-1] / 2000 == pytest.approx(0.1, rel=0.1)
+
+
+@pytest.mark.parametrize("spec, message", [
+    ("sine", "Unknown schedule"),
+    ("burst:spacing=0.1", "needs size="),
+    ("burst:size=0", "at least 1"),
+    ("burst:size=5,spacing=1", "doesn't fit"),
+    ("linear:from=0,to=1,over=1", "positive"),
+    ("step:from=1,to=2,steps=0,every=1", "at least 1"),
+    ("constant:rate=1", "Unknown parameter"),
+    ("poisson:rate=x", "must be a number"),
+    ("replay:", "needs a file path"),
+    ("replay:/nonexistent/timeline.tsv", "can't be opened"),
+])
+def test_invalid_specs(spec, message):
+    with pytest.raises(schedules.ScheduleError, match=message):
+        schedules.validate_spec(spec, 3.0)
+
+
+def test_poisson_without_delay_needs_rate():
+    with pytest.raises(schedules.ScheduleError, match="needs rate"):
+        schedules.validate_spec("poisson", 0)
+    schedules.validate_spec("poisson:rate=5", 0)
@@ -0,0 +1,69 @@
+from datetime import datetime
+import sigv4
+
+# Example credentials of the AWS SigV4 documentation and test suite
+ACCESS_KEY = "AKIDEXAMPLE"
+SECRET_KEY = "wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY"
+SUITE_TIME = datetime(2015, 8, 30, 12, 36, 0)
+
+
+def test_derive_signing_key():
+    # "Examples of how to derive a signing key for Signature Version 4"
+    key = sigv4.derive_signing_key(SECRET_KEY, "20120215", "us-east-1", "iam")
+    assert key.hex() == "f4780e2d9f65fa895f9c67b32ce1baf0b0d8a43505a000a1a9e090d414db404d"
+
+
+def test_suite_post_vanilla():
+    signer = sigv4.Signer(ACCESS_KEY, SECRET_KEY, "", region="us-east-1", service="service")
+    headers = signer.sign("POST", "https://example.amazonaws.com/", b"", SUITE_TIME)
+    assert headers["x-amz-date"] == "20150830T123600Z"
+    assert headers["Authorization"] == (
+        "AWS4-HMAC-SHA256 Credential=AKIDEXAMPLE/20150830/us-east-1/service/aws4_request, "
+        "SignedHeaders=host;x-amz-date, "
+        "Signature=5da7c1a2acd57cee7505fc6676e4e544621c30862966e37dddb68e92efbe5d6b")
+    assert "x-amz-security-token" not in headers
+
+
+def test_suite_get_vanilla():
+    signer = sigv4.Signer(ACCESS_KEY, SECRET_KEY, "", region="us-east-1", service="service")
+    headers = signer.sign("GET", "https://example.amazonaws.com/", b"", SUITE_TIME)
+    assert headers["Authorization"].endswith(
+        "Signature=5fa00fa31553b73ebf1942676e86291e8372ff2a2260956d9b8aae1d763fbf31")
+
+
+def test_cached_canonical_parts_give_same_signature():
+    signer = sigv4.Signer(ACCESS_KEY, SECRET_KEY, "", region="us-east-1", service="service")
+    first = signer.sign("POST", "https://example.amazonaws.com/", b"", SUITE_TIME)
+    assert list(signer._request_parts) == [("POST", "https://example.amazonaws.com/", "")]
+    head, tail, signed_headers = signer._request_parts[("POST", "https://example.amazonaws.com/", "")]
+    assert head == "POST\n/\n\nhost:example.amazonaws.com\nx-amz-date:"
+    assert tail == "\n\nhost;x-amz-date\n"
+
+    # Second request is built from the cached head/tail and signing key
+    assert signer.sign("POST", "https://example.amazonaws.com/", b"", SUITE_TIME) == first
+    assert len(signer._request_parts) == 1
+
+
+def test_session_token_is_signed():
+    signer = sigv4.Signer(ACCESS_KEY, SECRET_KEY, "TOKEN", region="us-west-2")
+    headers = signer.sign("POST", "https://ivs.us-west-2.amazonaws.com/PutMetadata", b"{}", SUITE_TIME)
+    assert headers["x-amz-security-token"] == "TOKEN"
+    assert "SignedHeaders=host;x-amz-date;x-amz-security-token," in headers["Authorization"]
+    head, tail, _ = signer._request_parts[("POST", "https://ivs.us-west-2.amazonaws.com/PutMetadata", "TOKEN")]
+    assert tail == "\nx-amz-security-token:TOKEN\n\nhost;x-amz-date;x-amz-security-token\n"
+
+
+def test_update_credentials_drops_cached_parts():
+    signer = sigv4.Signer("OLD", "old-secret", "old-token")
+    old = signer.sign("POST", "https://ivs.us-west-2.amazonaws.com/PutMetadata", b"{}", SUITE_TIME)
+
+    signer.update_credentials("NEW", "new-secret", "new-token")
+    assert signer._request_parts == {}
+    assert signer._signing_key_cache == (None, None, None)
+
+    new = signer.sign("POST", "https://ivs.us-west-2.amazonaws.com/PutMetadata", b"{}", SUITE_TIME)
+    assert new["x-amz-security-token"] == "new-token"
+    assert "Credential=NEW/" in new["Authorization"]
+    fresh = sigv4.Signer("NEW", "new-secret", "new-token")
+    assert new == fresh.sign("POST", "https://ivs.us-west-2.amazonaws.com/PutMetadata", b"{}", SUITE_TIME)
+    assert new["Authorization"] != old["Authorization"]
@@ -0,0 +1,51 @@
+import threading
+import time
+import socket
+import pytest
+import requests
+import mock_ivs
+import transport
+
+
+@pytest.fixture
+def slow_server():
+    server = mock_ivs.MockIVSServer(("127.0.0.1", 0), mock_ivs.MockConfig(latency=0.2)).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_waiting_for_a_connection_is_not_latency(slow_server):
+    # One connection for two threads: the second one waits for the first request to finish
+    http = transport.PooledTransport(pool_size=1)
+    latencies = []
+
+    def post() -> None:
+        start = time.monotonic()
+        http.post(slow_server.url, data=b"{}", timeout=5)
+        latencies.append(time.monotonic() - http.acquired_time(start))
+
+    threads = [threading.Thread(target=post) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    http.close()
+    assert len(latencies) == 2
+    assert max(latencies) < 0.35
+
+
+
+def test_error_class_tells_unsent_requests_apart(slow_server):
+    http = transport.PooledTransport(max_retries=0)
+    # Nothing listens on a port just released: the connection is refused before anything is sent
+    with socket.socket() as closed:
+        closed.bind(("127.0.0.1", 0))
+        port = closed.getsockname()[1]
+    with pytest.raises(requests.ConnectionError) as refused:
+        http.post(f"http://127.0.0.1:{port}/", data=b"{}", timeout=5)
+    with pytest.raises(requests.ReadTimeout) as timed_out:
+        http.post(slow_server.url, data=b"{}", timeout=0.05)
+    http.close()
+    assert transport.get_error_class(refused.value) == "NewConnectionError"
+    assert transport.get_error_class(timed_out.value) == "ReadTimeout"